@@ -4,19 +4,27 @@ Simple Flask API for SherlockRAG
 Allows Promptfoo to test via HTTP endpoint
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 import os
 import sys
+import json
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from chatbot import load_vector_store, retrieve_context, generate_answer
+from chatbot import (load_vector_store, enable_query_batching, retrieve_context,
+                     answer_query, get_answer_cache, get_index_manifest,
+                     stream_answer)
+from chunk_table import validate_filters
+from llm_clients import connection_stats
 
 app = Flask(__name__)
 
 # Load vector store once at startup
 print("Loading vector store...")
 vectorstore = load_vector_store("data/chroma_db")
+
+# Coalesce concurrent requests' vector searches into batched passes
+query_batcher = enable_query_batching(vectorstore)
 print("✅ Ready!")
 
 
@@ -24,33 +32,90 @@ print("✅ Ready!")
 def query():
     """
     Endpoint for Promptfoo to call
-    Expects JSON: {"prompt": "your question"}
-    Returns JSON: {"answer": "response"}
+    Expects JSON: {"prompt": "your question", "filters": {...}} (filters optional,
+    e.g. {"collection": "Case-Book", "year_min": 1910})
+    Returns JSON: {"answer": "response", "sources": [...], "cached": bool}
     """
     data = request.json
     prompt = data.get('prompt', '')
+    filters = data.get('filters')
     
     if not prompt:
         return jsonify({"error": "No prompt provided"}), 400
     
+    if filters is not None:
+        try:
+            validate_filters(filters)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    
     try:
-        # Query RAG
-        context, sources = retrieve_context(vectorstore, prompt)
-        answer = generate_answer(prompt, context, sources)
-        
-        return jsonify({
-            "answer": answer,
-            "sources": sources
-        })
+        # Query RAG (repeated questions come from the answer cache)
+        return jsonify(answer_query(vectorstore, prompt, filters))
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route('/query/stream', methods=['POST'])
+def query_stream():
+    """
+    Streaming variant of /query (Server-Sent Events)
+    Expects JSON: {"prompt": "your question", "filters": {...}} (filters optional)
+    Streams: "sources" event first, then "delta" events with answer text,
+    then "done" (or "error")
+    """
+    data = request.json
+    prompt = data.get('prompt', '')
+    filters = data.get('filters')
+    
+    if not prompt:
+        return jsonify({"error": "No prompt provided"}), 400
+    
+    if filters is not None:
+        try:
+            validate_filters(filters)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    
+    def generate():
+        try:
+            # Sources go out as soon as retrieval finishes
+            context, sources = retrieve_context(vectorstore, prompt, filters=filters)
+            yield sse_event("sources", {"sources": sources})
+            
+            # Then answer deltas as Claude produces them
+            for text in stream_answer(prompt, context, sources):
+                yield sse_event("delta", {"text": text})
+            
+            yield sse_event("done", {})
+        
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @app.route('/health', methods=['GET'])
 def health():
-    """Health check endpoint"""
-    return jsonify({"status": "healthy"})
+    """Health check endpoint (includes cache and LLM connection counters)"""
+    return jsonify({
+        "status": "healthy",
+        "index": get_index_manifest(vectorstore),
+        "embedding_cache": vectorstore.embeddings.stats(),
+        "llm_connections": connection_stats(),
+        "query_batching": query_batcher.stats(),
+        "answer_cache": get_answer_cache(vectorstore).stats()
+    })
 
 
 if __name__ == '__main__':
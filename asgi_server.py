@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Production ASGI server for SherlockRAG
+Async handlers, N worker processes sharing one preloaded model + index
+
+Run (multi-worker, see gunicorn.conf.py):
+    gunicorn -c gunicorn.conf.py asgi_server:app
+"""
+
+import os
+import sys
+import json
+import asyncio
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from chatbot import (load_vector_store, reopen_vector_store, enable_query_batching,
+                     get_query_batcher, async_multi_query_search, get_retrieval_pool,
+                     get_answer_cache, get_index_manifest, async_retrieve_context,
+                     async_answer_query, async_stream_answer)
+from chunk_table import validate_filters
+from llm_clients import connection_stats, close_async_clients
+
+PERSIST_DIRECTORY = "data/chroma_db"
+WARMUP_QUERY = "What is Sherlock Holmes's address?"
+
+# Load embedding model + keyword index at import time. With gunicorn's
+# preload_app this runs ONCE in the parent; forked workers share the pages.
+print("Loading vector store...")
+vectorstore = load_vector_store(PERSIST_DIRECTORY)
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    """Per-worker startup (reconnect + warm-up) and graceful shutdown."""
+    global vectorstore
+    app.state.ready = False
+    
+    # Fresh SQLite connection in this worker (model + index stay shared)
+    vectorstore = reopen_vector_store(vectorstore)
+    
+    # Coalesce concurrent requests' vector searches into batched passes
+    enable_query_batching(vectorstore)
+    
+    # Warm-up: first encoder pass + vector search before reporting ready
+    await async_multi_query_search(vectorstore, [WARMUP_QUERY], 8)
+    
+    app.state.ready = True
+    print(f"✅ Worker {os.getpid()} ready!")
+    
+    yield
+    
+    # Graceful shutdown (in-flight requests have already drained)
+    app.state.ready = False
+    await close_async_clients()
+    # Waiting for pool threads blocks, so do it off the event loop
+    await asyncio.get_running_loop().run_in_executor(None, lambda: get_retrieval_pool().shutdown(wait=True))
+    print(f"👋 Worker {os.getpid()} stopped")
+
+
+async def query(request: Request):
+    """
+    Async /query endpoint (same contract as api_server.py)
+    Expects JSON: {"prompt": "your question", "filters": {...}} (filters optional,
+    e.g. {"collection": "Case-Book", "year_min": 1910})
+    Returns JSON: {"answer": "response", "sources": [...], "cached": bool}
+    """
+    data = await request.json()
+    prompt = data.get('prompt', '')
+    filters = data.get('filters')
+    
+    if not prompt:
+        return JSONResponse({"error": "No prompt provided"}, status_code=400)
+    
+    if filters is not None:
+        try:
+            validate_filters(filters)
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+    
+    try:
+        return JSONResponse(await async_answer_query(vectorstore, prompt, filters))
+    
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def query_stream(request: Request):
+    """
+    Streaming /query/stream endpoint (Server-Sent Events)
+    Streams: "sources" first, then "delta" events, then "done" (or "error")
+    """
+    data = await request.json()
+    prompt = data.get('prompt', '')
+    filters = data.get('filters')
+    
+    if not prompt:
+        return JSONResponse({"error": "No prompt provided"}, status_code=400)
+    
+    if filters is not None:
+        try:
+            validate_filters(filters)
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+    
+    async def generate():
+        try:
+            context, sources = await async_retrieve_context(vectorstore, prompt, filters=filters)
+            yield sse_event("sources", {"sources": sources})
+            
+            async for text in async_stream_answer(prompt, context, sources):
+                yield sse_event("delta", {"text": text})
+            
+            yield sse_event("done", {})
+        
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+    
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+async def health(request: Request):
+    """Liveness endpoint (includes cache and LLM connection counters)"""
+    return JSONResponse({
+        "status": "healthy",
+        "index": get_index_manifest(vectorstore),
+        "embedding_cache": vectorstore.embeddings.stats(),
+        "llm_connections": connection_stats(),
+        "query_batching": get_query_batcher(vectorstore).stats(),
+        "answer_cache": get_answer_cache(vectorstore).stats()
+    })
+
+
+async def ready(request: Request):
+    """Readiness endpoint: 200 only after this worker has warmed up"""
+    if getattr(request.app.state, 'ready', False):
+        return JSONResponse({"status": "ready"})
+    return JSONResponse({"status": "warming_up"}, status_code=503)
+
+
+app = Starlette(
+    routes=[
+        Route('/query', query, methods=['POST']),
+        Route('/query/stream', query_stream, methods=['POST']),
+        Route('/health', health, methods=['GET']),
+        Route('/ready', ready, methods=['GET']),
+    ],
+    lifespan=lifespan
+)
+
+
+if __name__ == '__main__':
+    # Single-process run (development); use gunicorn for multiple workers
+    import uvicorn
+    uvicorn.run(app, host='127.0.0.1', port=8000)
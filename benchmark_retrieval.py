@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Retrieval Benchmark for SherlockRAG
+Memory, latency and recall@k of each vector backend against exact float32 search
+
+Each backend is loaded and measured in its own fresh process, so its peak
+RSS (load + searches, including memory-mapped pages it touched) is not
+mixed up with the other backends or the embedding model.
+
+Run (after build_index.py):
+    python benchmark_retrieval.py
+"""
+
+import os                                           # Paths
+import sys                                          # Import test questions
+import time                                         # Latency
+import resource                                     # Peak RSS
+import multiprocessing as mp                        # One process per backend
+from typing import Dict, List, Tuple                # Type hints
+import numpy as np                                  # Percentiles
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests"))
+
+from test_suite_comprehensive import test_questions  # 50 benchmark queries
+from chatbot import load_vector_store, COLLECTION_NAME
+from index_manifest import chunk_id_of
+from vector_backends import (FlatVectorStore, QuantizedVectorStore, IVFVectorStore, StoryIndex,
+                             QUANTIZED_VARIANTS)
+
+
+PERSIST_DIRECTORY = "data/chroma_db"
+K = 8
+REPEATS = 20                                        # Timed passes over all queries
+
+
+def recall_at_k(results: List[List[int]], exact: List[List[int]]) -> float:
+    """Mean fraction of the exact top-k found by a backend."""
+    return float(np.mean([len(set(found) & set(truth)) / len(truth) for found, truth in zip(results, exact)]))
+
+
+def time_searches(search_fn, query_vectors: np.ndarray) -> Dict:
+    """Single-query latency (p50/p95) and batched throughput of a search function."""
+    latencies = []
+    for _ in range(REPEATS):
+        for vector in query_vectors:
+            start = time.perf_counter()
+            search_fn(vector[None, :])
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        search_fn(query_vectors)
+    batch_seconds = (time.perf_counter() - start) / REPEATS
+
+    return {
+        'p50_ms': np.percentile(latencies, 50) * 1000,
+        'p95_ms': np.percentile(latencies, 95) * 1000,
+        'batch_qps': len(query_vectors) / batch_seconds,
+    }
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process right now (Linux /proc; else the peak so far)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def chroma_rows(collection, flat: FlatVectorStore):
+    """Search function over Chroma's HNSW index, returning flat-index rows."""
+    row_of = {chunk_id_of(meta): row for row, meta in enumerate(flat.metadatas)}
+
+    def search(query_vectors: np.ndarray) -> List[List[int]]:
+        results = collection.query(
+            query_embeddings=query_vectors.tolist(), n_results=K, include=['metadatas']
+        )
+        return [[row_of[chunk_id_of(meta)] for meta in metas] for metas in results['metadatas']]
+
+    return search
+
+
+def flat_rows(store: FlatVectorStore):
+    """Search function over a flat (or quantized) store, returning rows."""
+    def search(query_vectors: np.ndarray) -> List[List[int]]:
+        return [[row for row, _ in hits] for hits in store.search_vectors(query_vectors, K)]
+    return search
+
+
+def hierarchical_rows(stories: StoryIndex, store: FlatVectorStore, top_stories: int):
+    """Search function over the two-stage story -> chunk index, returning rows."""
+    def search(query_vectors: np.ndarray) -> List[List[int]]:
+        hits = stories.search_vectors(store, query_vectors, K, top_stories=top_stories)
+        return [[row for row, _ in rows] for rows in hits]
+    return search
+
+
+def open_backend(kind: str, options: Dict) -> Tuple:
+    """Load one backend; returns (search function, resident vector bytes or None)."""
+    flat = FlatVectorStore(PERSIST_DIRECTORY, None)
+
+    if kind == "float32":
+        return flat_rows(flat), flat.vectors.nbytes
+    if kind == "chroma":
+        import chromadb
+        collection = chromadb.PersistentClient(path=PERSIST_DIRECTORY).get_collection(COLLECTION_NAME)
+        return chroma_rows(collection, flat), None
+    if kind == "quantized":
+        store = QuantizedVectorStore(PERSIST_DIRECTORY, None, **options)
+        return flat_rows(store), store.memory_bytes()
+    if kind == "ivf":
+        return flat_rows(IVFVectorStore(PERSIST_DIRECTORY, None, **options)), flat.vectors.nbytes
+
+    stories = StoryIndex(PERSIST_DIRECTORY)
+    return hierarchical_rows(stories, flat, **options), flat.vectors.nbytes + stories.centroids.nbytes
+
+
+def measure_backend(kind: str, options: Dict, query_vectors: np.ndarray,
+                    exact: List[List[int]]) -> Dict:
+    """Load and time one backend (run in a fresh process); returns its table row."""
+    rss_before = current_rss_bytes()
+    search, memory = open_backend(kind, options)
+
+    result = time_searches(search, query_vectors)
+    result['recall'] = recall_at_k(search(query_vectors), exact)
+    result['memory'] = memory
+    result['peak_rss'] = max(0, peak_rss_bytes() - rss_before)
+    return result
+
+
+def main():
+    """Main function."""
+    print("\n" + "=" * 70)
+    print("🔍 SHERLOCKRAG - RETRIEVAL BENCHMARK")
+    print("=" * 70)
+
+    chroma = load_vector_store(PERSIST_DIRECTORY, backend="chroma")
+    flat = FlatVectorStore(PERSIST_DIRECTORY, chroma.embeddings)
+
+    queries = [q['question'] for q in test_questions]
+    query_vectors = np.asarray(chroma.embeddings.embed_documents(queries), dtype=np.float32)
+    print(f"\n📝 {len(queries)} queries, k={K}, {len(flat):,} chunks")
+
+    backends = [
+        ("float32 exact", "float32", {}),
+        (f"chroma ({COLLECTION_NAME})", "chroma", {}),
+    ]
+    for precision, scales in QUANTIZED_VARIANTS:
+        label = precision if precision == "float16" else f"int8/{scales}"
+        for rescore_factor in (0, 4):
+            name = f"{label} + rescore x{rescore_factor}" if rescore_factor else f"{label} (no rescore)"
+            backends.append((name, "quantized",
+                             {'precision': precision, 'scales': scales, 'rescore_factor': rescore_factor}))
+
+    # IVF recall/latency curve: nprobe = nlist is exact search
+    ivf = IVFVectorStore(PERSIST_DIRECTORY, chroma.embeddings)
+    for nprobe in sorted({min(n, ivf.nlist) for n in (1, 4, ivf.settings['nprobe'], 16, 32, ivf.nlist)}):
+        backends.append((f"ivf nlist={ivf.nlist} nprobe={nprobe}", "ivf", {'nprobe': nprobe}))
+
+    # Hierarchical recall/latency curve: all stories is exact search
+    stories = StoryIndex(PERSIST_DIRECTORY)
+    for top_stories in sorted({min(n, len(stories)) for n in (1, 3, 5, 10, len(stories))}):
+        backends.append((f"hierarchical top_stories={top_stories}", "hierarchical", {'top_stories': top_stories}))
+
+    exact = flat_rows(flat)(query_vectors)
+
+    print(f"\n{'Backend':<32}{'Memory':>10}{'Peak RSS':>10}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'Batch QPS':>11}{'Recall@' + str(K):>11}")
+    print("-" * 92)
+    # spawn: every backend starts from an empty process (no inherited pages)
+    context = mp.get_context('spawn')
+    for name, kind, options in backends:
+        with context.Pool(1) as pool:
+            row = pool.apply(measure_backend, (kind, options, query_vectors, exact))
+        memory_text = f"{row['memory'] / 1e6:.2f} MB" if row['memory'] is not None else "n/a"
+        print(f"{name:<32}{memory_text:>10}{row['peak_rss'] / 1e6:>7.1f} MB{row['p50_ms']:>9.3f}"
+              f"{row['p95_ms']:>9.3f}{row['batch_qps']:>11.0f}{row['recall']:>11.3f}")
+
+    print("\n   Memory = resident vectors scanned per query (rescoring reads")
+    print("   candidate rows from the float32 file on demand)")
+    print("   Peak RSS = growth of a fresh process's peak resident set while")
+    print("   loading the backend and running every search above")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,70 @@
 """
 Build Sherlock Holmes RAG Index
 Chunks stories, creates embeddings, stores in ChromaDB
+
+Incremental: every chunk is hashed, only new or changed chunks are embedded
+(others come from an on-disk embedding cache) and only the difference is
+upserted into / deleted from the collection.
 """
 
 import os                                      # File operations
+import sys                                     # Import test questions
 import json                                    # Load metadata
-from typing import List, Dict                  # Type hints
+import hashlib                                 # Chunk hashes
+from typing import List, Dict, Tuple           # Type hints
+import numpy as np                             # Embedding matrix
 from langchain.text_splitter import RecursiveCharacterTextSplitter  # Smart chunking
 from langchain_community.embeddings import HuggingFaceEmbeddings    # Create embeddings
 from langchain_community.vectorstores import Chroma                 # Vector database
 from langchain.docstore.document import Document                    # Document structure
+from index_manifest import write_manifest, load_manifest, make_chunk_id  # Index fingerprint / chunk IDs
+from embedding_cache import DiskEmbeddingStore                      # Chunk-embedding cache
+from embedding_pipeline import encode_parallel, default_workers     # Multi-process encoding
+from chunk_store import write_chunk_store, OFFSETS_FILENAME         # mmap'd chunk texts
+from chunk_table import write_chunk_table                           # Columnar chunk metadata
+from vector_backends import (export_flat_index, build_ivf_index, build_story_index,  # NumPy backends
+                             build_quantized_index, quantized_variant, QUANTIZED_VARIANTS,
+                             IVFVectorStore, recall_at_k)
+
+
+# Embedding model (chatbot.py must load the same one)
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_DIM = 384
+
+# Chroma collection (chatbot.py loads the same one)
+COLLECTION_NAME = "sherlock_holmes"
+
+# Chunk embeddings keyed by model + chunk hash (reused across builds)
+CHUNK_EMBEDDING_CACHE = "data/cache/chunk_embeddings.bin"
+
+# Chunks per Chroma upsert (Chroma caps the batch size)
+UPSERT_BATCH = 1000
+
+# Parallel encoding of cache misses (see embedding_pipeline.py)
+EMBED_TORCH_THREADS = 2                                 # torch threads per worker
+EMBED_WORKERS = default_workers(EMBED_TORCH_THREADS)    # Encoder processes (fill the machine)
+EMBED_BATCH_SIZE = 256                                  # Chunks per worker task
+PARALLEL_MIN_CHUNKS = 2000                              # Fewer misses: encode in-process (no pool startup)
+EMBEDDING_MATRIX = "data/cache/build_embeddings.npy"  # Scratch matrix the workers write into
+
+# Chroma HNSW parameters. Chroma fixes them when the collection is created
+# (search_ef included: it cannot be changed per query or at load time), so
+# build_vector_db recreates the collection when these differ from the ones
+# it was built with. VECTOR_BACKEND=ivf has a query-time knob (IVF_NPROBE).
+HNSW_SETTINGS = {
+    "hnsw:space": "l2",             # Vectors are normalized, so same ranking as cosine
+    "hnsw:M": 16,                   # Graph degree (memory vs recall)
+    "hnsw:construction_ef": 200,    # Build-time beam width (build time vs graph quality)
+    "hnsw:search_ef": 64,           # Query-time beam width (latency vs recall)
+}
+
+# IVF index for VECTOR_BACKEND=ivf (None = sqrt(num_chunks) lists)
+IVF_NLIST = None
+IVF_NPROBE = 8
+IVF_RECALL_NPROBES = (1, 2, 4, 8, 16)   # nprobe values whose recall@8 is reported
+
+# Real questions (not indexed chunk vectors) for measuring IVF recall
+TESTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests")
 
 
 def load_stories(stories_dir: str, metadata_file: str) -> List[Document]:
@@ -103,10 +158,12 @@ def chunk_documents(documents: List[Document],
     for doc in documents:
         chunks = text_splitter.split_documents([doc])
         
-        # Add chunk index to metadata
+        # Add chunk index and stable integer chunk ID to metadata
         for i, chunk in enumerate(chunks):
             chunk.metadata['chunk_index'] = i
             chunk.metadata['total_chunks'] = len(chunks)
+            chunk.metadata['chunk_id'] = make_chunk_id(chunk.metadata['story_id'], i)
+            chunk.metadata['chunk_hash'] = chunk_hash(chunk.page_content)
         
         all_chunks.extend(chunks)
     
@@ -116,6 +173,60 @@ def chunk_documents(documents: List[Document],
     return all_chunks
 
 
+def chunk_hash(text: str) -> str:
+    """SHA-1 of a chunk's text (what its embedding depends on)."""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def embedding_key(text_hash: str) -> bytes:
+    """Chunk-embedding cache key: model name + chunk hash."""
+    return hashlib.sha1(f"{EMBEDDING_MODEL}\n{text_hash}".encode('utf-8')).hexdigest().encode('ascii')
+
+
+def embed_chunks(chunks: List[Document], 
+                 embeddings: HuggingFaceEmbeddings,
+                 cache: DiskEmbeddingStore) -> Tuple[np.ndarray, int]:
+    """
+    Embeddings for chunks, encoding only those missing from the cache.
+    
+    Args:
+        chunks: Chunks to embed (metadata must have chunk_hash)
+        embeddings: Embedding model
+        cache: On-disk chunk-embedding cache (new embeddings are appended)
+        
+    Returns:
+        (vectors, number of chunks actually encoded)
+    """
+    keys = [embedding_key(chunk.metadata['chunk_hash']) for chunk in chunks]
+    vectors = [cache.get(key) for key in keys]
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    
+    if len(missing) >= PARALLEL_MIN_CHUNKS and EMBED_WORKERS > 1:
+        # Encoder pool writing into a memory-mapped matrix
+        computed = encode_parallel(
+            [chunks[i].page_content for i in missing],
+            EMBEDDING_MATRIX,
+            EMBEDDING_MODEL,
+            EMBEDDING_DIM,
+            workers=EMBED_WORKERS,
+            batch_size=EMBED_BATCH_SIZE,
+            torch_threads=EMBED_TORCH_THREADS
+        )
+    elif missing:
+        # One batched encoder pass in this process
+        computed = np.asarray(
+            embeddings.embed_documents([chunks[i].page_content for i in missing]),
+            dtype=np.float32
+        )
+    
+    if missing:
+        cache.put_many([keys[i] for i in missing], computed)
+        for i, vector in zip(missing, computed):
+            vectors[i] = vector
+    
+    return np.stack(vectors) if vectors else np.empty((0, EMBEDDING_DIM), dtype=np.float32), len(missing)
+
+
 def create_embeddings() -> HuggingFaceEmbeddings:
     """
     Create embedding model (converts text to vectors for semantic search).
@@ -127,7 +238,7 @@ def create_embeddings() -> HuggingFaceEmbeddings:
     print(f"   Model: all-MiniLM-L6-v2 (384 dimensions)")
     
     embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
+        model_name=EMBEDDING_MODEL,
         model_kwargs={'device': 'cpu'},  # Use CPU (faster setup, works everywhere)
         encode_kwargs={'normalize_embeddings': True}  # Better similarity scores
     )
@@ -141,7 +252,11 @@ def build_vector_store(chunks: List[Document],
                        embeddings: HuggingFaceEmbeddings,
                        persist_directory: str) -> Chroma:
     """
-    Create ChromaDB vector store from chunks.
+    Create or incrementally update the ChromaDB vector store.
+    
+    Chunks whose metadata (including chunk_hash) is unchanged are left
+    alone; new or changed chunks are upserted, and chunks no longer
+    produced are deleted. A different embedding model re-embeds everything.
     
     Args:
         chunks: List of document chunks
@@ -153,22 +268,110 @@ def build_vector_store(chunks: List[Document],
     """
     print(f"\n💾 Building vector database...")
     print(f"   Location: {persist_directory}")
-    print(f"   This will take 2-3 minutes...")
     
-    # Create or load vector store
-    vectorstore = Chroma.from_documents(
-        documents=chunks,
-        embedding=embeddings,
+    # Create or load vector store (Chroma ids are the stable chunk IDs)
+    vectorstore = Chroma(
         persist_directory=persist_directory,
-        collection_name="sherlock_holmes"
+        embedding_function=embeddings,
+        collection_name=COLLECTION_NAME,
+        collection_metadata=HNSW_SETTINGS
     )
+    collection = vectorstore._collection
     
-    print(f"   ✅ Vector database created!")
-    print(f"   📊 {len(chunks)} chunks indexed")
+    # Chroma ignores collection_metadata for an existing collection: rebuild to apply new settings
+    built_with = {key: (collection.metadata or {}).get(key) for key in HNSW_SETTINGS}
+    if collection.count() and built_with != HNSW_SETTINGS:
+        print(f"   ♻️  HNSW settings changed ({built_with} -> {HNSW_SETTINGS}), recreating collection")
+        vectorstore.delete_collection()
+        vectorstore = Chroma(
+            persist_directory=persist_directory,
+            embedding_function=embeddings,
+            collection_name=COLLECTION_NAME,
+            collection_metadata=HNSW_SETTINGS
+        )
+        collection = vectorstore._collection
+    
+    # Diff against what is already indexed
+    existing = collection.get(include=['metadatas'])
+    indexed = dict(zip(existing['ids'], existing['metadatas']))
+    manifest = load_manifest(persist_directory)
+    model_changed = manifest is not None and manifest['embedding_model'] != EMBEDDING_MODEL
+    
+    ids = [str(chunk.metadata['chunk_id']) for chunk in chunks]
+    changed = [
+        (chunk_id, chunk) for chunk_id, chunk in zip(ids, chunks)
+        if model_changed or indexed.get(chunk_id) != chunk.metadata
+    ]
+    removed = sorted(set(indexed) - set(ids))
+    
+    print(f"   📊 {len(chunks) - len(changed)} unchanged, {len(changed)} new/changed, {len(removed)} removed")
+    
+    # Embed only what changed (cache hits for metadata-only changes and reverted edits)
+    cache = DiskEmbeddingStore(CHUNK_EMBEDDING_CACHE, EMBEDDING_DIM)
+    vectors, encoded = embed_chunks([chunk for _, chunk in changed], embeddings, cache)
+    
+    for start in range(0, len(changed), UPSERT_BATCH):
+        batch = changed[start:start + UPSERT_BATCH]
+        collection.upsert(
+            ids=[chunk_id for chunk_id, _ in batch],
+            embeddings=vectors[start:start + UPSERT_BATCH].tolist(),
+            documents=[chunk.page_content for _, chunk in batch],
+            metadatas=[chunk.metadata for _, chunk in batch]
+        )
+    
+    for start in range(0, len(removed), UPSERT_BATCH):
+        collection.delete(ids=removed[start:start + UPSERT_BATCH])
+    
+    print(f"   ✅ Vector database up to date!")
+    print(f"   🧠 {encoded} chunks embedded ({len(changed) - encoded} from cache)")
+    print(f"   📊 {collection.count()} chunks indexed")
+    
+    # Manifest identifies this build (caches key on its fingerprint)
+    manifest = write_manifest(
+        persist_directory,
+        EMBEDDING_MODEL,
+        [chunk.page_content for chunk in chunks],
+        [chunk.metadata for chunk in chunks]
+    )
+    print(f"   🔖 Index fingerprint: {manifest['fingerprint']}")
+    
+    # Same vectors as a memory-mapped matrix for the NumPy backend
+    export_flat_index(vectorstore._collection, persist_directory)
+    print(f"   🧮 Flat index exported (VECTOR_BACKEND=numpy)")
+    
+    # Compact codes for the quantized backends, quantized block by block once per build
+    for precision, scales in QUANTIZED_VARIANTS:
+        build_quantized_index(persist_directory, precision, scales)
+    print(f"   🗜️  Quantized codes written (VECTOR_BACKEND=int8/float16: "
+          f"{', '.join(quantized_variant(p, s) for p, s in QUANTIZED_VARIANTS)})")
+    
+    # One centroid per story for two-stage retrieval
+    story_count = build_story_index(persist_directory)
+    print(f"   📖 Story index built (RETRIEVAL_MODE=hierarchical, {story_count} stories)")
+    
+    # Inverted-file index over the same vectors, with its recall against exact search
+    ivf_settings = build_ivf_index(persist_directory, nlist=IVF_NLIST, nprobe=IVF_NPROBE)
+    print(f"   🗂️  IVF index built (VECTOR_BACKEND=ivf, nlist={ivf_settings['nlist']}, "
+          f"nprobe={ivf_settings['nprobe']})")
+    ivf = IVFVectorStore(persist_directory, embeddings)
+    questions = np.asarray([embeddings.embed_query(question) for question in load_recall_questions()],
+                           dtype=np.float32)
+    recalls = [
+        f"nprobe={nprobe}: {recall_at_k(ivf, questions, 8, nprobe=nprobe):.3f}"
+        for nprobe in IVF_RECALL_NPROBES if nprobe <= ivf.nlist
+    ]
+    print(f"   🎯 IVF recall@8 on {len(questions)} test questions ({', '.join(recalls)})")
     
     return vectorstore
 
 
+def load_recall_questions() -> List[str]:
+    """Questions from the comprehensive test suite (held out from the index)."""
+    sys.path.insert(0, TESTS_DIR)
+    from test_suite_comprehensive import test_questions
+    return [question['question'] for question in test_questions]
+
+
 def test_retrieval(vectorstore: Chroma, test_queries: List[str], k: int = 3):
     """
     Test the retrieval system with sample queries.
@@ -219,6 +422,11 @@ def print_statistics(vectorstore: Chroma):
     print(f"   Database: ChromaDB (persistent)")
     print(f"   Search: Semantic similarity (cosine)")
     
+    # Settings the collection was actually built with (Chroma defaults for missing keys)
+    metadata = collection.metadata or {}
+    hnsw = {key: value for key, value in metadata.items() if key.startswith('hnsw:')}
+    print(f"   HNSW (effective): {hnsw or 'Chroma defaults'}")
+    
     print("=" * 70)
 
 
@@ -258,6 +466,24 @@ def main():
     # Step 4: Build vector store
     vectorstore = build_vector_store(chunks, embeddings, persist_directory)
     
+    # Chunk texts as byte offsets into the story files (served from mmap by chatbot.py)
+    count = write_chunk_store(
+        persist_directory,
+        stories_dir,
+        [chunk.page_content for chunk in chunks],
+        [chunk.metadata for chunk in chunks],
+        load_manifest(persist_directory)['fingerprint']
+    )
+    print(f"   📍 Chunk offsets recorded for {count} chunks")
+    
+    # Columnar metadata (story fields + offsets) for pre-filtered retrieval
+    write_chunk_table(
+        persist_directory,
+        [chunk.metadata for chunk in chunks],
+        np.load(os.path.join(persist_directory, OFFSETS_FILENAME))
+    )
+    print(f"   🗃️  Chunk table written (story, year, collection, type, offsets)")
+    
     # Step 5: Test retrieval
     test_queries = [
         "What is Sherlock Holmes's address?",
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Cache Store for SherlockRAG
+Bounded TTL caches with pluggable backends (in-process dict or shared SQLite file)
+"""
+
+import os                                           # File operations
+import json                                         # Value serialization
+import time                                         # TTL bookkeeping
+import sqlite3                                      # Shared on-disk backend
+import threading                                    # Thread safety (Flask is threaded)
+from collections import OrderedDict                 # LRU ordering
+from typing import Any, Callable, Dict, List, Optional  # Type hints
+import numpy as np                                  # Near-duplicate lookup
+
+from embedding_cache import normalize_query         # Shared query normalization
+
+
+class MemoryCacheBackend:
+    """In-process LRU dict with a TTL (private to one worker)."""
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 86400):
+        """
+        Args:
+            max_entries: Size bound (least recently used entries are evicted)
+            ttl_seconds: Entry lifetime
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None if missing/expired."""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            created, value = entry
+            if time.time() - created > self.ttl_seconds:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        """Store a value, evicting the least recently used entry if full."""
+        with self._lock:
+            self.entries[key] = (time.time(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def purge(self, keep_prefix: str) -> int:
+        """Drop every entry whose key doesn't start with keep_prefix."""
+        with self._lock:
+            stale = [key for key in self.entries if not key.startswith(keep_prefix)]
+            for key in stale:
+                del self.entries[key]
+        return len(stale)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class SQLiteCacheBackend:
+    """
+    SQLite-file cache shared by every worker process pointing at the same path.
+
+    Values are stored as JSON. WAL mode lets readers and a writer proceed
+    concurrently; each thread keeps its own connection.
+    """
+
+    def __init__(self, path: str, max_entries: int = 1000, ttl_seconds: float = 86400):
+        """
+        Args:
+            path: SQLite database file
+            max_entries: Size bound (least recently used entries are evicted)
+            ttl_seconds: Entry lifetime
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+        conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Per-thread connection."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None if missing/expired."""
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value FROM cache WHERE key = ? AND created > ?",
+            (key, now - self.ttl_seconds)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+        conn.commit()
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any):
+        """Store a value, then drop expired and least recently used rows."""
+        conn = self._connect()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now, now)
+        )
+        conn.execute("DELETE FROM cache WHERE created <= ?", (now - self.ttl_seconds,))
+        conn.execute(
+            "DELETE FROM cache WHERE key IN ("
+            "SELECT key FROM cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        conn.commit()
+
+    def purge(self, keep_prefix: str) -> int:
+        """Drop every row whose key doesn't start with keep_prefix."""
+        conn = self._connect()
+        deleted = conn.execute(
+            "DELETE FROM cache WHERE substr(key, 1, ?) != ?",
+            (len(keep_prefix), keep_prefix)
+        ).rowcount
+        conn.commit()
+        return deleted
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+def make_cache_backend(path: Optional[str] = None, max_entries: int = 1000,
+                       ttl_seconds: float = 86400):
+    """
+    Pick a backend: SQLite file if a path is given, otherwise in-process dict.
+
+    Args:
+        path: SQLite file shared across workers (None = in-process only)
+        max_entries: Size bound
+        ttl_seconds: Entry lifetime
+
+    Returns:
+        Cache backend with get(key) / set(key, value) / purge(keep_prefix)
+    """
+    if path:
+        return SQLiteCacheBackend(path, max_entries=max_entries, ttl_seconds=ttl_seconds)
+    return MemoryCacheBackend(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+
+class SemanticCache:
+    """
+    Query-keyed cache with optional near-duplicate lookup.
+
+    Exact lookups use the normalized query text. If an embedding function is
+    given, a miss falls back to the most similar recently stored query
+    (cosine >= threshold), so paraphrases hit too. The near-duplicate vectors
+    live in-process; exact keys are shared through the backend.
+
+    Keys start with the index fingerprint: entries written against any other
+    index build are purged from the backend when the cache is created.
+    """
+
+    def __init__(self, backend, namespace: str = "", fingerprint: str = "",
+                 embed_fn: Optional[Callable[[str], List[float]]] = None,
+                 similarity_threshold: float = 0.95, max_vectors: int = 2000):
+        """
+        Args:
+            backend: Cache backend (see make_cache_backend)
+            namespace: Key prefix (e.g. model name) so unrelated caches can share a backend
+            fingerprint: Index fingerprint (see index_manifest.py); "" = not index-bound
+            embed_fn: Text -> normalized embedding (enables near-duplicate lookup)
+            similarity_threshold: Minimum cosine similarity for a near-duplicate hit
+            max_vectors: How many recent queries to keep for near-duplicate lookup
+        """
+        self.backend = backend
+        self.namespace = namespace
+        self.fingerprint = fingerprint
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self.max_vectors = max_vectors
+
+        self.vectors = None                         # (max_vectors, dim) ring buffer
+        self.vector_keys: List[Optional[str]] = [None] * max_vectors
+        self.next_slot = 0
+
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.purged = backend.purge(f"{fingerprint}|") if fingerprint else 0
+        self._lock = threading.Lock()
+
+    def _key(self, text: str) -> str:
+        return f"{self.fingerprint}|{self.namespace}:{normalize_query(text)}"
+
+    def get(self, text: str) -> Optional[Any]:
+        """Look up by exact normalized text, then by embedding similarity."""
+        key = self._key(text)
+        value = self.backend.get(key)
+        if value is not None:
+            self.exact_hits += 1
+            return value
+
+        if self.embed_fn is not None and self.vectors is not None:
+            query_vector = np.asarray(self.embed_fn(text), dtype=np.float32)
+            with self._lock:
+                similarities = self.vectors @ query_vector
+                best = int(np.argmax(similarities))
+                best_key = self.vector_keys[best]
+            if best_key is not None and similarities[best] >= self.similarity_threshold:
+                value = self.backend.get(best_key)
+                if value is not None:
+                    self.near_hits += 1
+                    return value
+
+        self.misses += 1
+        return None
+
+    def set(self, text: str, value: Any):
+        """Store a value (and remember its embedding for near-duplicate lookup)."""
+        key = self._key(text)
+        self.backend.set(key, value)
+
+        if self.embed_fn is not None:
+            vector = np.asarray(self.embed_fn(text), dtype=np.float32)
+            with self._lock:
+                if self.vectors is None:
+                    self.vectors = np.zeros((self.max_vectors, len(vector)), dtype=np.float32)
+                self.vectors[self.next_slot] = vector
+                self.vector_keys[self.next_slot] = key
+                self.next_slot = (self.next_slot + 1) % self.max_vectors
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for monitoring."""
+        return {
+            'exact_hits': self.exact_hits,
+            'near_duplicate_hits': self.near_hits,
+            'misses': self.misses,
+            'purged_stale': self.purged,
+            'entries': len(self.backend),
+        }
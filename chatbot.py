@@ -5,62 +5,460 @@ Ask questions about the complete Sherlock Holmes canon!
 """
 
 import os                                           # Environment variables
-from typing import List                             # Type hints
+import hashlib                                      # Cache key fingerprints
+import asyncio                                      # Async pipeline
+import numpy as np                                  # Title routing lookups
+from typing import Dict, List, Iterator, AsyncIterator  # Type hints
+from concurrent.futures import ThreadPoolExecutor   # Speculative parallel retrieval
 from dotenv import load_dotenv                      # Load .env file
 from langchain_community.embeddings import HuggingFaceEmbeddings  # Embeddings
 from langchain_community.vectorstores import Chroma              # Vector DB
-import anthropic                                    # Direct Anthropic SDK
+from langchain.docstore.document import Document                 # Document structure
+from llm_clients import get_client, get_async_client  # Shared pooled Anthropic clients
+from keyword_index import KeywordIndex              # Inverted keyword index
+from embedding_cache import CachedEmbeddings        # Query-embedding cache
+from cache_store import make_cache_backend, SemanticCache  # Variation / answer caches
+from index_manifest import load_manifest, build_manifest, chunk_id_of  # Index fingerprint / chunk IDs
+from query_batcher import QueryBatcher              # Micro-batching scheduler
+from title_router import get_title_router          # Story-title routing
+from chunk_store import load_chunk_store            # mmap'd chunk texts
+from chunk_table import (ChunkTable, load_chunk_table, build_chunk_table,  # Metadata pre-filters
+                         chroma_where, filters_key)
+from vector_backends import FlatVectorStore, QuantizedVectorStore, IVFVectorStore, StoryIndex  # NumPy backends
 
 
 # Load environment variables
 load_dotenv()
 
+# Chroma collection (created by build_index.py)
+COLLECTION_NAME = "sherlock_holmes"
 
-def load_vector_store(persist_directory: str) -> Chroma:
+# Embedding model (must match the model used by build_index.py)
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_DIM = 384
+
+# Vector backend: "chroma" (SQLite + HNSW), "numpy" (exact flat search),
+# "int8" / "float16" (quantized flat search + exact rescoring; less memory,
+# not lower latency) or "ivf"
+# (inverted-file search), see vector_backends.py
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+
+# IVF lists searched per query (unset = value persisted by build_index.py; higher = better recall)
+IVF_NPROBE = int(os.getenv("IVF_NPROBE")) if os.getenv("IVF_NPROBE") else None
+
+# Retrieval mode: "flat" (search every chunk) or "hierarchical" (rank story
+# centroids first, then search chunks only inside the top stories)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "flat")
+HIERARCHICAL_TOP_STORIES = 5
+
+# Optional on-disk tier for the query-embedding cache (survives restarts)
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR")
+
+# Query-variation cache (skips the variation LLM call for repeated/paraphrased questions)
+VARIATION_MODEL = "claude-sonnet-4-20250514"
+VARIATION_CACHE_PATH = os.getenv("VARIATION_CACHE_PATH")   # SQLite file shared by workers
+VARIATION_CACHE_SIZE = 5000
+VARIATION_CACHE_TTL = 7 * 24 * 3600                         # 1 week
+VARIATION_SIMILARITY = 0.95                                 # Near-duplicate threshold
+
+# Answer generation
+ANSWER_MODEL = "claude-sonnet-4-20250514"
+ANSWER_SYSTEM_PROMPT = """You are an expert on Sherlock Holmes stories by Arthur Conan Doyle. 
+Answer questions based on the provided context from the actual stories.
+
+Guidelines:
+- Answer directly and conversationally
+- Reference specific stories when relevant
+- If the context doesn't contain the answer, say so honestly
+- Be engaging and show knowledge of the Holmes canon
+- Keep answers concise (2-4 paragraphs max)"""
+ANSWER_MAX_TOKENS = 2048
+ANSWER_TEMPERATURE = 0.5
+
+# Full-response answer cache (skips retrieval + generation for repeated questions)
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH")         # SQLite file shared by workers
+ANSWER_CACHE_SIZE = 1000
+ANSWER_CACHE_TTL = 24 * 3600                                # 1 day
+
+# Context assembly: chunks passed to the answer model, the first BM25_CONTEXT_SLOTS
+# of them reserved for the top lexical hits (exact-term matches such as
+# "jezail" or "moustache" that embeddings rank too low)
+CONTEXT_CHUNKS = 15
+BM25_CONTEXT_SLOTS = 3
+
+# Title routing: questions naming a story get an extra search list scoped to its chunks
+ROUTE_BY_TITLE = True
+
+# Speculative retrieval: search the original query while variations are generated
+SPECULATIVE_RETRIEVAL = True
+RETRIEVAL_THREADS = 8
+
+# Micro-batching of concurrent vector searches (API servers)
+QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", "5"))
+QUERY_BATCH_MAX = 64
+
+# Keyword index (built once when the vector store is loaded)
+_keyword_index = None
+
+# Manifest of the loaded index build (set by load_vector_store)
+_index_manifest = None
+
+# Chunk texts memory-mapped from the story files (set by load_vector_store; None = texts in memory)
+_chunk_store = None
+
+# Columnar chunk metadata, rows aligned with the keyword index (set by load_vector_store)
+_chunk_table = None
+
+# Story centroid index for hierarchical retrieval (set by load_vector_store)
+_story_index = None
+
+# Query-variation and answer caches (created on first use)
+_variation_cache = None
+_answer_cache = None
+
+# Thread pool for speculative retrieval (created on first use)
+_retrieval_pool = None
+
+# Micro-batching scheduler for vector searches (see enable_query_batching)
+_query_batcher = None
+
+
+def get_retrieval_pool() -> ThreadPoolExecutor:
+    """Return the shared retrieval thread pool, creating it on first use."""
+    global _retrieval_pool
+    
+    if _retrieval_pool is None:
+        _retrieval_pool = ThreadPoolExecutor(max_workers=RETRIEVAL_THREADS, thread_name_prefix="retrieval")
+    
+    return _retrieval_pool
+
+
+def build_keyword_index(vectorstore: Chroma) -> KeywordIndex:
+    """
+    Pull every chunk out of the vector store ONCE and build the inverted keyword index.
+    
+    Args:
+        vectorstore: ChromaDB (or flat) vector store
+        
+    Returns:
+        KeywordIndex over all chunks
+    """
+    global _keyword_index
+    
+    if isinstance(vectorstore, FlatVectorStore):
+        _keyword_index = KeywordIndex(vectorstore.documents, vectorstore.metadatas)
+        return _keyword_index
+    
+    if _chunk_store is not None:
+        # Texts come from the mmap'd story files, not a second copy out of SQLite
+        all_docs = vectorstore._collection.get(include=['metadatas'])
+        metadatas = [meta or {} for meta in all_docs['metadatas']]
+        try:
+            _keyword_index = KeywordIndex(_chunk_store.ordered(metadatas), metadatas)
+            return _keyword_index
+        except KeyError:
+            discard_chunk_store()
+    
+    all_docs = vectorstore._collection.get(include=['documents', 'metadatas'])
+    _keyword_index = KeywordIndex(all_docs['documents'], all_docs['metadatas'])
+    
+    return _keyword_index
+
+
+def get_keyword_index(vectorstore: Chroma) -> KeywordIndex:
+    """Return the keyword index, building it if load_vector_store didn't."""
+    if _keyword_index is None:
+        return build_keyword_index(vectorstore)
+    return _keyword_index
+
+
+def load_vector_store(persist_directory: str, backend: str = VECTOR_BACKEND) -> Chroma:
     """
     Load the existing vector store.
     
     Args:
         persist_directory: Path to ChromaDB
+        backend: "chroma", "numpy" (FlatVectorStore), "int8"/"float16" (QuantizedVectorStore)
+            or "ivf" (IVFVectorStore)
         
     Returns:
-        Loaded Chroma vector store
+        Loaded vector store
     """
     print("📚 Loading Sherlock Holmes knowledge base...")
     
-    # Create embeddings (same model as indexing)
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
-        model_kwargs={'device': 'cpu'},
-        encode_kwargs={'normalize_embeddings': True}
+    # Create embeddings (same model as indexing), wrapped in the query cache
+    embeddings = CachedEmbeddings(
+        HuggingFaceEmbeddings(
+            model_name=EMBEDDING_MODEL,
+            model_kwargs={'device': 'cpu'},
+            encode_kwargs={'normalize_embeddings': True}
+        ),
+        model_name=EMBEDDING_MODEL,
+        dim=EMBEDDING_DIM
     )
     
-    # Load vector store
-    vectorstore = Chroma(
-        persist_directory=persist_directory,
-        embedding_function=embeddings,
-        collection_name="sherlock_holmes"
-    )
+    # Chunk texts shared through the page cache (None if the index predates chunk stores)
+    chunk_store = open_chunk_store(persist_directory)
+    
+    # Load vector store (flat backends fall back to Chroma if their files are missing)
+    vectorstore = None
+    try:
+        if backend == "numpy":
+            vectorstore = FlatVectorStore(persist_directory, embeddings, chunk_store=chunk_store)
+        elif backend in ("int8", "float16"):
+            vectorstore = QuantizedVectorStore(persist_directory, embeddings, precision=backend,
+                                               chunk_store=chunk_store)
+        elif backend == "ivf":
+            vectorstore = IVFVectorStore(persist_directory, embeddings, nprobe=IVF_NPROBE,
+                                         chunk_store=chunk_store)
+    except FileNotFoundError as e:
+        print(f"   ⚠️  {e}; falling back to the chroma backend")
+        backend = "chroma"
+    
+    if vectorstore is None:
+        vectorstore = Chroma(
+            persist_directory=persist_directory,
+            embedding_function=embeddings,
+            collection_name=COLLECTION_NAME
+        )
+    elif chunk_store is not None and vectorstore.chunk_store is None:
+        discard_chunk_store()
+    
+    # Build keyword index once (keyword fallback no longer scans the collection)
+    keyword_index = build_keyword_index(vectorstore)
+    
+    # Metadata columns for pre-filtered search (same row order as the keyword index)
+    open_chunk_table(persist_directory, keyword_index)
+    
+    # Story centroids for two-stage retrieval
+    if RETRIEVAL_MODE == "hierarchical":
+        open_story_index(persist_directory, vectorstore)
+    
+    # Identify the index build; every cache keys on its fingerprint
+    manifest = load_index_manifest(persist_directory, keyword_index)
+    if EMBEDDING_CACHE_DIR:
+        embeddings.attach_disk(EMBEDDING_CACHE_DIR, manifest['fingerprint'])
     
-    print("   ✅ Knowledge base loaded (5,039 chunks)")
+    print(f"   ✅ Knowledge base loaded ({len(keyword_index):,} chunks, index {manifest['fingerprint']}, {backend} backend)")
     
     return vectorstore
 
 
-def generate_query_variations(query: str, api_key: str) -> List[str]:
+def open_chunk_store(persist_directory: str):
     """
-    Generate query variations to improve retrieval coverage.
+    Map the chunk store written by build_index.py.
     
     Args:
-        query: Original user question
-        api_key: Anthropic API key
+        persist_directory: Path to ChromaDB
         
     Returns:
-        List of query variations (including original)
+        ChunkStore, or None if the index has none (texts then stay in memory)
     """
-    client = anthropic.Anthropic(api_key=api_key)
+    global _chunk_store
     
-    prompt = f"""Given this question about Sherlock Holmes stories:
+    manifest = load_manifest(persist_directory)
+    _chunk_store = load_chunk_store(persist_directory, manifest['fingerprint'] if manifest else None)
+    if _chunk_store is None:
+        print("   ⚠️  No usable chunk store (rebuild with build_index.py); chunk texts kept in memory")
+    
+    return _chunk_store
+
+
+def discard_chunk_store():
+    """Stop serving texts from a chunk store that does not cover the loaded index."""
+    global _chunk_store
+    
+    _chunk_store = None
+    print("   ⚠️  Chunk store does not match the index (rebuild with build_index.py); chunk texts kept in memory")
+
+
+def open_story_index(persist_directory: str, vectorstore: Chroma):
+    """
+    Load the story centroid index written by build_index.py.
+    
+    Args:
+        persist_directory: Path to ChromaDB
+        vectorstore: Loaded vector store (its flat rows must match the story index)
+        
+    Returns:
+        StoryIndex, or None if the index has none (retrieval then stays flat)
+    """
+    global _story_index
+    
+    try:
+        _story_index = StoryIndex(persist_directory)
+    except FileNotFoundError:
+        print("   ⚠️  No story index (rebuild with build_index.py); using flat retrieval")
+        _story_index = None
+    
+    if _story_index is not None and isinstance(vectorstore, FlatVectorStore):
+        if _story_index.story_offsets[-1] != len(vectorstore.vectors):
+            print("   ⚠️  Story index is out of date (rebuild with build_index.py); using flat retrieval")
+            _story_index = None
+    
+    return _story_index
+
+
+def open_chunk_table(persist_directory: str, keyword_index: KeywordIndex) -> ChunkTable:
+    """
+    Load the chunk table written by build_index.py, aligned with the keyword index.
+    
+    Indexes built without one get a table derived from the chunk metadata
+    (same columns, no offsets).
+    
+    Args:
+        persist_directory: Path to ChromaDB
+        keyword_index: Keyword index holding every chunk
+        
+    Returns:
+        ChunkTable whose rows match keyword index (and flat index) rows
+    """
+    global _chunk_table
+    
+    table = load_chunk_table(persist_directory)
+    try:
+        _chunk_table = table.ordered(keyword_index.metadatas) if table is not None else None
+    except KeyError:
+        print("   ⚠️  Chunk table does not match the index (rebuild with build_index.py)")
+        _chunk_table = None
+    
+    if _chunk_table is None:
+        _chunk_table = ChunkTable(build_chunk_table(keyword_index.metadatas)).ordered(keyword_index.metadatas)
+    
+    return _chunk_table
+
+
+def get_chunk_table(vectorstore: Chroma) -> ChunkTable:
+    """Return the chunk table, building it if load_vector_store didn't."""
+    if _chunk_table is None:
+        return open_chunk_table(vectorstore._persist_directory, get_keyword_index(vectorstore))
+    return _chunk_table
+
+
+def filter_mask(vectorstore: Chroma, filters: Dict = None):
+    """
+    Boolean row mask (keyword / flat index rows) for metadata filters.
+    
+    Args:
+        vectorstore: Vector store
+        filters: e.g. {"collection": "Case-Book"} or {"year_min": 1910}
+            (see chunk_table.FILTER_KEYS); None = no filtering
+        
+    Returns:
+        Mask, or None when unfiltered
+    """
+    if not filters:
+        return None
+    return get_chunk_table(vectorstore).mask(filters)
+
+
+def route_query(vectorstore: Chroma, query: str, filters: Dict = None):
+    """
+    Filters for a search scoped to the stories a question names.
+    
+    Routing is a soft signal: "What happens in The Red Circle?" adds one
+    extra vector-search list over that story's chunks to the RRF fusion,
+    while the unscoped lists still cover every other story. Explicit title
+    filters are left alone, and titles missing from the index are ignored.
+    
+    Args:
+        vectorstore: Vector store
+        query: User's question
+        filters: Caller's metadata filters (None = none)
+        
+    Returns:
+        The caller's filters plus a title filter, or None if nothing was routed
+    """
+    if not ROUTE_BY_TITLE or (filters and 'title' in filters):
+        return None
+    
+    titles = get_title_router().match(query)
+    if titles:
+        indexed = np.isin(titles, get_chunk_table(vectorstore)['title'])
+        titles = [title for title, found in zip(titles, indexed) if found]
+    if not titles:
+        return None
+    
+    print(f"   🧭 Routed to: {', '.join(titles)}")
+    return {**(filters or {}), 'title': titles}
+
+
+def load_index_manifest(persist_directory: str, keyword_index: KeywordIndex) -> Dict:
+    """
+    Read the manifest written by build_index.py.
+    
+    Indexes built before manifests existed get one derived from the
+    collection contents (same fingerprint scheme, unknown build time).
+    
+    Args:
+        persist_directory: Path to ChromaDB
+        keyword_index: Keyword index holding every chunk
+        
+    Returns:
+        Manifest dict
+    """
+    global _index_manifest
+    
+    manifest = load_manifest(persist_directory)
+    
+    if manifest is None:
+        print("   ⚠️  No index manifest found (rebuild with build_index.py); deriving fingerprint")
+        manifest = build_manifest(EMBEDDING_MODEL, keyword_index.documents, keyword_index.metadatas)
+    elif manifest['embedding_model'] != EMBEDDING_MODEL:
+        print(f"   ⚠️  Index was built with {manifest['embedding_model']}, loading {EMBEDDING_MODEL}")
+    
+    _index_manifest = manifest
+    
+    return manifest
+
+
+def get_index_manifest(vectorstore: Chroma) -> Dict:
+    """Return the manifest of the loaded index build."""
+    if _index_manifest is None:
+        return load_index_manifest(vectorstore._persist_directory, get_keyword_index(vectorstore))
+    return _index_manifest
+
+
+def get_index_fingerprint(vectorstore: Chroma) -> str:
+    """Fingerprint of the loaded index build (cache key component)."""
+    return get_index_manifest(vectorstore)['fingerprint']
+
+
+def reopen_vector_store(vectorstore: Chroma) -> Chroma:
+    """
+    Re-open the Chroma connection inside a forked worker process.
+    
+    SQLite connections must not be used across fork(), so each worker gets
+    its own client. The embedding model and keyword index loaded by the
+    parent are reused as-is (shared copy-on-write), but the new Chroma
+    client loads a private copy of the HNSW index in every worker; the
+    flat backends ("numpy", "ivf", ...) are shared instead.
+    
+    Args:
+        vectorstore: Vector store loaded in the parent process
+        
+    Returns:
+        Vector store with a fresh Chroma client
+    """
+    # Flat backend holds no connections (memory-mapped pages are fork-safe)
+    if isinstance(vectorstore, FlatVectorStore):
+        return vectorstore
+    
+    from chromadb.api.client import SharedSystemClient
+    
+    # Drop the client cache inherited from the parent
+    SharedSystemClient.clear_system_cache()
+    
+    return Chroma(
+        persist_directory=vectorstore._persist_directory,
+        embedding_function=vectorstore.embeddings,
+        collection_name=COLLECTION_NAME
+    )
+
+
+def build_variation_prompt(query: str) -> str:
+    """Prompt asking Claude for alternative phrasings of the question."""
+    return f"""Given this question about Sherlock Holmes stories:
 "{query}"
 
 Generate 2 alternative ways to search for this information. Focus on:
@@ -70,125 +468,348 @@ Generate 2 alternative ways to search for this information. Focus on:
 
 Return ONLY the 2 alternative queries, one per line, no numbering or explanation."""
 
+
+def parse_variations(query: str, text: str) -> List[str]:
+    """Split Claude's reply into variations; returns original + up to 2 variations."""
+    variations = text.strip().split('\n')
+    variations = [v.strip() for v in variations if v.strip()]
+    
+    # Return original + variations
+    return [query] + variations[:2]
+
+
+def generate_query_variations(query: str, api_key: str) -> List[str]:
+    """
+    Generate query variations to improve retrieval coverage.
+    
+    Args:
+        query: Original user question
+        api_key: Anthropic API key
+        
+    Returns:
+        List of query variations (including original)
+    """
+    client = get_client(api_key)
+    
     message = client.messages.create(
-        model="claude-sonnet-4-20250514",
+        model=VARIATION_MODEL,
         max_tokens=150,
         temperature=0.7,
-        messages=[{"role": "user", "content": prompt}]
+        messages=[{"role": "user", "content": build_variation_prompt(query)}]
     )
     
-    variations = message.content[0].text.strip().split('\n')
-    variations = [v.strip() for v in variations if v.strip()]
+    return parse_variations(query, message.content[0].text)
+
+
+def get_variation_cache(vectorstore: Chroma) -> SemanticCache:
+    """Return the query-variation cache, creating it on first use."""
+    global _variation_cache
     
-    # Return original + variations
-    return [query] + variations[:2]
+    if _variation_cache is None:
+        backend = make_cache_backend(
+            VARIATION_CACHE_PATH,
+            max_entries=VARIATION_CACHE_SIZE,
+            ttl_seconds=VARIATION_CACHE_TTL
+        )
+        _variation_cache = SemanticCache(
+            backend,
+            namespace=VARIATION_MODEL,
+            fingerprint=get_index_fingerprint(vectorstore),
+            embed_fn=vectorstore.embeddings.embed_query,   # Cached, reused by retrieval
+            similarity_threshold=VARIATION_SIMILARITY
+        )
+    
+    return _variation_cache
+
+
+def get_query_variations(vectorstore: Chroma, query: str, api_key: str) -> List[str]:
+    """
+    Query variations, served from the variation cache when possible.
+    
+    Args:
+        vectorstore: ChromaDB vector store (its embeddings power near-duplicate lookup)
+        query: Original user question
+        api_key: Anthropic API key
+        
+    Returns:
+        List of query variations (including original)
+    """
+    cache = get_variation_cache(vectorstore)
+    
+    cached = cache.get(query)
+    if cached is not None:
+        print(f"   ⚡ Query variations served from cache")
+        return [query] + cached
+    
+    query_variations = generate_query_variations(query, api_key)
+    cache.set(query, query_variations[1:])
+    
+    return query_variations
+
+
+def enable_query_batching(vectorstore: Chroma,
+                          window_ms: float = QUERY_BATCH_WINDOW_MS,
+                          max_batch: int = QUERY_BATCH_MAX) -> QueryBatcher:
+    """
+    Coalesce concurrent multi_query_search calls into batched searches.
+    
+    Used by the API servers: queries arriving within `window_ms` of each
+    other share one encoder pass and one vector search.
+    
+    Args:
+        vectorstore: ChromaDB vector store to batch searches for
+        window_ms: Collection window after the first request arrives
+        max_batch: Maximum queries per batch
+        
+    Returns:
+        The active QueryBatcher
+    """
+    global _query_batcher
+    
+    batcher = QueryBatcher(
+        lambda queries, k: _search_batch(vectorstore, queries, k),
+        window_ms=window_ms,
+        max_batch=max_batch
+    )
+    batcher.vectorstore = vectorstore
+    _query_batcher = batcher
+    
+    return batcher
+
 
+def get_query_batcher(vectorstore: Chroma):
+    """Active QueryBatcher for this vector store, or None."""
+    if _query_batcher is not None and _query_batcher.vectorstore is vectorstore:
+        return _query_batcher
+    return None
 
-def retrieve_context(vectorstore: Chroma, query: str, k: int = 5) -> tuple:
+
+def _search_batch(vectorstore: Chroma, queries: List[str], k: int,
+                  filters: Dict = None) -> List[List[Document]]:
+    """One batched encoder pass + one vector search for all queries."""
+    # Batched embedding: one forward pass for all queries
+    query_embeddings = vectorstore.embeddings.embed_documents(queries)
+    
+    if _story_index is not None:
+        return _hierarchical_search(vectorstore, query_embeddings, k, filters)
+    
+    # Flat backend: one GEMM over the (pre-filtered) embedding matrix
+    if isinstance(vectorstore, FlatVectorStore):
+        return vectorstore.search_documents(query_embeddings, k, filter_mask(vectorstore, filters))
+    
+    # Single Chroma query with multiple query embeddings (filters become a `where` clause)
+    if _chunk_store is not None:
+        # Decode only the selected chunks from the mmap'd story files
+        results = vectorstore._collection.query(
+            query_embeddings=query_embeddings,
+            n_results=k,
+            where=chroma_where(filters),
+            include=['metadatas']
+        )
+        return [
+            [Document(page_content=_chunk_store.text(chunk_id_of(metadata or {})), metadata=metadata or {})
+             for metadata in metadatas]
+            for metadatas in results['metadatas']
+        ]
+    
+    results = vectorstore._collection.query(
+        query_embeddings=query_embeddings,
+        n_results=k,
+        where=chroma_where(filters),
+        include=['documents', 'metadatas']
+    )
+    
+    return [
+        [Document(page_content=text, metadata=metadata or {}) for text, metadata in zip(texts, metadatas)]
+        for texts, metadatas in zip(results['documents'], results['metadatas'])
+    ]
+
+
+def _hierarchical_search(vectorstore: Chroma, query_embeddings: List[List[float]], k: int,
+                         filters: Dict = None) -> List[List[Document]]:
+    """Two-stage search: top stories by centroid, then chunks inside those stories only."""
+    mask = filter_mask(vectorstore, filters)
+    
+    # Flat backend: exact scores over the chosen stories' rows of the float32 matrix
+    if isinstance(vectorstore, FlatVectorStore):
+        hits = _story_index.search_vectors(vectorstore, query_embeddings, k,
+                                           top_stories=HIERARCHICAL_TOP_STORIES, mask=mask)
+        return [[vectorstore.get(row) for row, _ in rows] for rows in hits]
+    
+    # Chroma: queries restricted by `where` to their top stories; queries that
+    # share a story set go out as one batched query
+    stories = None
+    if mask is not None:
+        stories = np.isin(_story_index.story_ids, get_chunk_table(vectorstore)['story_id'][mask])
+    
+    groups: Dict[tuple, List[int]] = {}
+    for i, embedding in enumerate(query_embeddings):
+        positions = _story_index.top_stories(np.asarray(embedding, dtype=np.float32),
+                                             HIERARCHICAL_TOP_STORIES, stories)
+        story_ids = tuple(sorted(int(_story_index.story_ids[p]) for p in positions))
+        groups.setdefault(story_ids, []).append(i)
+    
+    where = chroma_where(filters)
+    include = ['metadatas'] if _chunk_store is not None else ['documents', 'metadatas']
+    results: List[List[Document]] = [[] for _ in query_embeddings]
+    for story_ids, indices in groups.items():
+        if not story_ids:
+            continue                                # Filters match no chunk (Chroma rejects an empty $in)
+        story_clause = {'story_id': {'$in': list(story_ids)}}
+        story_where = story_clause if where is None else {'$and': [*where.get('$and', [where]), story_clause]}
+        
+        result = vectorstore._collection.query(
+            query_embeddings=[query_embeddings[i] for i in indices],
+            n_results=k,
+            where=story_where,
+            include=include
+        )
+        for n, i in enumerate(indices):
+            metadatas = [metadata or {} for metadata in result['metadatas'][n]]
+            if _chunk_store is not None:
+                texts = [_chunk_store.text(chunk_id_of(metadata)) for metadata in metadatas]
+            else:
+                texts = result['documents'][n]
+            results[i] = [Document(page_content=text, metadata=metadata)
+                          for text, metadata in zip(texts, metadatas)]
+    
+    return results
+
+
+def multi_query_search(vectorstore: Chroma, queries: List[str], k: int = 8,
+                       filters: Dict = None) -> List[List[Document]]:
     """
-    Retrieve relevant context for a query using MULTI-QUERY + KEYWORD FALLBACK.
+    Similarity search for several queries in ONE encoder pass and ONE Chroma query.
+    
+    When query batching is enabled, unfiltered queries join the next
+    micro-batch shared with other concurrent requests.
     
     Args:
         vectorstore: ChromaDB vector store
-        query: User's question
+        queries: Query texts (e.g. original + variations)
         k: Number of chunks to retrieve per query
+        filters: Metadata pre-filters (see filter_mask); None = whole corpus
         
     Returns:
-        (context_text, source_info)
+        One ranked list of Documents per query (same order as queries)
     """
-    # Generate query variations
-    api_key = os.getenv("ANTHROPIC_API_KEY")
-    query_variations = generate_query_variations(query, api_key)
+    batcher = get_query_batcher(vectorstore)
+    if batcher is not None and not filters:
+        return batcher.search(queries, k)
+    
+    return _search_batch(vectorstore, queries, k, filters)
+
+
+async def async_multi_query_search(vectorstore: Chroma, queries: List[str], k: int = 8,
+                                   filters: Dict = None) -> List[List[Document]]:
+    """Async counterpart of multi_query_search (awaits the batch without holding a thread)."""
+    batcher = get_query_batcher(vectorstore)
+    if batcher is not None and not filters:
+        return await asyncio.wrap_future(batcher.submit(queries, k))
+    
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_retrieval_pool(), _search_batch, vectorstore, queries, k, filters)
+
+
+def keyword_search(vectorstore: Chroma, query: str, k: int = 8, filters: Dict = None) -> List[Document]:
+    """
+    BM25 lexical search over all chunks.
+    
+    Args:
+        vectorstore: ChromaDB vector store
+        query: User's question
+        k: Number of chunks to return
+        filters: Metadata pre-filters (see filter_mask); None = whole corpus
+        
+    Returns:
+        Ranked list of Documents (best first)
+    """
+    keyword_index = get_keyword_index(vectorstore)
+    results = []
+    
+    for doc_id, _ in keyword_index.search(query, k=k, mask=filter_mask(vectorstore, filters)):
+        doc_text, metadata = keyword_index.get(doc_id)
+        results.append(Document(page_content=doc_text, metadata=metadata))
+    
+    return results
+
+
+def reciprocal_rank_fusion(ranked_lists: List[List[Document]], k: int = 60) -> List[Document]:
+    """
+    Merge several ranked result lists with Reciprocal Rank Fusion.
+    
+    Each document scores sum(1 / (k + rank)) over the lists it appears in,
+    so chunks found by several retrievers (or ranked high by one) win.
+    
+    Args:
+        ranked_lists: Result lists, each ordered best first
+        k: RRF damping constant (60 is the standard choice)
+        
+    Returns:
+        Unique documents ordered by fused score
+    """
+    scores = {}
+    docs = {}
     
+    for results in ranked_lists:
+        for rank, doc in enumerate(results, 1):
+            # Stable integer chunk ID (text hash only if metadata lacks one)
+            chunk_id = chunk_id_of(doc.metadata)
+            if chunk_id is None:
+                chunk_id = hash(doc.page_content)
+            
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(chunk_id, doc)
+    
+    ranked_ids = sorted(scores, key=scores.get, reverse=True)
+    return [docs[chunk_id] for chunk_id in ranked_ids]
+
+
+def assemble_context(query: str, query_variations: List[str],
+                     ranked_lists: List[List[Document]], bm25_results: List[Document]) -> tuple:
+    """
+    Fuse semantic + lexical rankings and format the top chunks as context.
+    
+    Args:
+        query: User's question
+        query_variations: Original + generated variations
+        ranked_lists: One vector-search result list per variation
+        bm25_results: BM25 result list
+        
+    Returns:
+        (context_text, source_info)
+    """
     print(f"\n🔍 Multi-Query Retrieval:")
     print(f"   Original: {query}")
     print(f"   Variations:")
     for i, var in enumerate(query_variations[1:], 1):
         print(f"      {i}. {var}")
     
-    # Retrieve with each query variation
-    all_results = []
-    seen_content = set()  # Avoid duplicates
+    ranked_lists = list(ranked_lists)
     
-    for q in query_variations:
-        results = vectorstore.similarity_search(q, k=8)  # 8 chunks per query variation
-        
-        for doc in results:
-            # Use first 100 chars as unique identifier
-            content_id = doc.page_content[:100]
-            
-            if content_id not in seen_content:
-                seen_content.add(content_id)
-                all_results.append(doc)
-    
-    # KEYWORD FALLBACK: Extract key terms and search literally
-    query_lower = query.lower()
-    keywords = []
-    
-    # Extract potential keywords from query
-    if 'moustache' in query_lower or 'mustache' in query_lower:
-        keywords.append('moustache')  # Search for British spelling (in the text)
-    if 'watson' in query_lower:
-        keywords.append('watson')
-        
-        # Detect wound/injury queries and add anatomical terms
-        if any(word in query_lower for word in ['wound', 'injury', 'injured', 'shot', 'hurt']):
-            keywords.extend(['shoulder', 'jezail', 'leg', 'bullet', 'struck'])
-            print(f"   🔍 Detected wound query - adding anatomical terms")
-    if 'red circle' in query_lower:
-        keywords.append('red circle')
-    if 'red-headed league' in query_lower or 'red headed league' in query_lower:
-        keywords.append('red-headed league')
-    if 'tobacco' in query_lower:
-        keywords.append('tobacco')
-    if 'shoulder' in query_lower or 'wound' in query_lower:
-        # For wound questions, search for anatomical terms
-        if 'watson' in query_lower:
-            keywords.extend(['shoulder', 'jezail'])
-    
-    # If we have keywords, do literal text search
-    if len(keywords) >= 1:  # Trigger if we have ANY keywords
-        print(f"   🔑 Keyword fallback: searching for {keywords}")
-        
-        # Get ALL documents and filter by keywords
-        collection = vectorstore._collection
-        all_docs = collection.get(include=['documents', 'metadatas'])
-        
-        keyword_matches = 0
-        
-        for i, (doc_text, metadata) in enumerate(zip(all_docs['documents'], all_docs['metadatas'])):
-            doc_text_lower = doc_text.lower()
-            
-            # Check if ALL keywords appear in document
-            if all(keyword.lower() in doc_text_lower for keyword in keywords):
-                content_id = doc_text[:100]
-                
-                if content_id not in seen_content:
-                    seen_content.add(content_id)
-                    
-                    # Create Document object
-                    from langchain.docstore.document import Document
-                    doc = Document(page_content=doc_text, metadata=metadata)
-                    all_results.insert(0, doc)  # Add to FRONT (high priority!)
-                    keyword_matches += 1
-                    
-                    title = metadata.get('title', 'Unknown')
-                    print(f"      ✅ Keyword match #{keyword_matches}: {title}")
-                    
-                    # Limit keyword matches to avoid flooding
-                    if keyword_matches >= 5:
-                        break
-        
-        if keyword_matches == 0:
-            print(f"      ⚠️  No exact keyword matches found")
+    if bm25_results:
+        top_titles = [doc.metadata.get('title', 'Unknown') for doc in bm25_results[:3]]
+        print(f"   🔑 BM25: {len(bm25_results)} lexical matches (top: {', '.join(top_titles)})")
+        ranked_lists.append(bm25_results)
+    else:
+        print(f"      ⚠️  No lexical matches found")
+    
+    # Fuse semantic + lexical rankings
+    all_results = reciprocal_rank_fusion(ranked_lists)
     
     print(f"   📚 Retrieved {len(all_results)} unique chunks\n")
     
+    # Top BM25 hits go first (as the old keyword fallback did), then the fused ranking
+    context_docs = {}
+    for doc in bm25_results[:BM25_CONTEXT_SLOTS] + all_results:
+        chunk_id = chunk_id_of(doc.metadata)
+        context_docs.setdefault(chunk_id if chunk_id is not None else hash(doc.page_content), doc)
+    
     # Combine chunks into context (take top results)
     context_parts = []
     sources = []
     
-    for i, doc in enumerate(all_results[:15], 1):  # Limit to 15 best chunks
+    for i, doc in enumerate(list(context_docs.values())[:CONTEXT_CHUNKS], 1):
         title = doc.metadata.get('title', 'Unknown Story')
         content = doc.page_content
         
@@ -203,34 +824,58 @@ def retrieve_context(vectorstore: Chroma, query: str, k: int = 5) -> tuple:
     return context_text, sources
 
 
-def generate_answer(query: str, context: str, sources: List[str]) -> str:
+def retrieve_context(vectorstore: Chroma, query: str, k: int = 5,
+                     speculative: bool = SPECULATIVE_RETRIEVAL, filters: Dict = None) -> tuple:
     """
-    Generate answer using Claude with retrieved context.
+    Retrieve relevant context for a query using MULTI-QUERY + BM25, fused with RRF.
     
     Args:
+        vectorstore: ChromaDB vector store
         query: User's question
-        context: Retrieved context from stories
-        sources: List of source story titles
+        k: Number of chunks to retrieve per query
+        speculative: Overlap the variation LLM call with original-query search
+        filters: Metadata pre-filters, e.g. {"collection": "Case-Book", "year_min": 1910}
         
     Returns:
-        Claude's answer
+        (context_text, source_info)
     """
-    # Initialize Anthropic client
     api_key = os.getenv("ANTHROPIC_API_KEY")
-    client = anthropic.Anthropic(api_key=api_key)
+    routed = route_query(vectorstore, query, filters)
     
-    # Create prompt
-    system_prompt = """You are an expert on Sherlock Holmes stories by Arthur Conan Doyle. 
-Answer questions based on the provided context from the actual stories.
+    if speculative:
+        # SPECULATIVE: start original-query vector search + BM25 while the
+        # variation LLM call is in flight, then search the variations.
+        # The LLM call stays on this thread: the shared pool only runs short
+        # searches, so concurrent requests never queue behind each other's LLM calls
+        pool = get_retrieval_pool()
+        original_future = pool.submit(multi_query_search, vectorstore, [query], 8, filters)
+        bm25_future = pool.submit(keyword_search, vectorstore, query, 8, filters)
+        routed_future = pool.submit(multi_query_search, vectorstore, [query], 8, routed) if routed else None
+        
+        query_variations = get_query_variations(vectorstore, query, api_key)
+        variation_lists = (multi_query_search(vectorstore, query_variations[1:], k=8, filters=filters)
+                           if query_variations[1:] else [])
+        
+        ranked_lists = original_future.result() + variation_lists
+        if routed_future is not None:
+            ranked_lists += routed_future.result()
+        bm25_results = bm25_future.result()
+    else:
+        # Generate query variations, then retrieve with ALL of them at once
+        query_variations = get_query_variations(vectorstore, query, api_key)
+        ranked_lists = multi_query_search(vectorstore, query_variations, k=8, filters=filters)  # 8 chunks per variation
+        if routed:
+            ranked_lists += multi_query_search(vectorstore, [query], k=8, filters=routed)
+        
+        # LEXICAL RETRIEVAL: BM25 over all chunks (replaces hardcoded keyword rules)
+        bm25_results = keyword_search(vectorstore, query, k=8, filters=filters)
+    
+    return assemble_context(query, query_variations, ranked_lists, bm25_results)
 
-Guidelines:
-- Answer directly and conversationally
-- Reference specific stories when relevant
-- If the context doesn't contain the answer, say so honestly
-- Be engaging and show knowledge of the Holmes canon
-- Keep answers concise (2-4 paragraphs max)"""
 
-    user_prompt = f"""Context from Sherlock Holmes stories:
+def build_answer_prompt(query: str, context: str) -> str:
+    """User prompt: retrieved context followed by the question."""
+    return f"""Context from Sherlock Holmes stories:
 
 {context}
 
@@ -238,20 +883,262 @@ Question: {query}
 
 Answer based on the context above:"""
 
+
+def generate_answer(query: str, context: str, sources: List[str]) -> str:
+    """
+    Generate answer using Claude with retrieved context.
+    
+    Args:
+        query: User's question
+        context: Retrieved context from stories
+        sources: List of source story titles
+        
+    Returns:
+        Claude's answer
+    """
+    # Shared Anthropic client (keep-alive connection pool)
+    api_key = os.getenv("ANTHROPIC_API_KEY")
+    client = get_client(api_key)
+    
     # Generate response
     message = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=2048,
-        temperature=0.5,
-        system=system_prompt,
+        model=ANSWER_MODEL,
+        max_tokens=ANSWER_MAX_TOKENS,
+        temperature=ANSWER_TEMPERATURE,
+        system=ANSWER_SYSTEM_PROMPT,
         messages=[
-            {"role": "user", "content": user_prompt}
+            {"role": "user", "content": build_answer_prompt(query, context)}
         ]
     )
     
     return message.content[0].text
 
 
+def stream_answer(query: str, context: str, sources: List[str]) -> Iterator[str]:
+    """
+    Stream the answer token-by-token (same prompt as generate_answer).
+    
+    Args:
+        query: User's question
+        context: Retrieved context from stories
+        sources: List of source story titles
+        
+    Yields:
+        Text deltas as Claude produces them
+    """
+    client = get_client(os.getenv("ANTHROPIC_API_KEY"))
+    
+    with client.messages.stream(
+        model=ANSWER_MODEL,
+        max_tokens=ANSWER_MAX_TOKENS,
+        temperature=ANSWER_TEMPERATURE,
+        system=ANSWER_SYSTEM_PROMPT,
+        messages=[
+            {"role": "user", "content": build_answer_prompt(query, context)}
+        ]
+    ) as stream:
+        for text in stream.text_stream:
+            yield text
+
+
+def answer_prompt_hash() -> str:
+    """Hash of everything that shapes an answer besides question and context."""
+    template = build_answer_prompt("{query}", "{context}")
+    settings = f"{ANSWER_SYSTEM_PROMPT}\n{template}\n{ANSWER_MAX_TOKENS}\n{ANSWER_TEMPERATURE}"
+    return hashlib.sha1(settings.encode('utf-8')).hexdigest()[:16]
+
+
+def get_answer_cache(vectorstore: Chroma) -> SemanticCache:
+    """
+    Return the answer cache, creating it on first use.
+    
+    Keys are the normalized question, namespaced by answer model and prompt
+    template hash, under the index fingerprint. Exact matches only: a
+    paraphrase may deserve a different answer.
+    """
+    global _answer_cache
+    
+    if _answer_cache is None:
+        backend = make_cache_backend(
+            ANSWER_CACHE_PATH,
+            max_entries=ANSWER_CACHE_SIZE,
+            ttl_seconds=ANSWER_CACHE_TTL
+        )
+        _answer_cache = SemanticCache(
+            backend,
+            namespace=f"{ANSWER_MODEL}:{answer_prompt_hash()}",
+            fingerprint=get_index_fingerprint(vectorstore)
+        )
+    
+    return _answer_cache
+
+
+def answer_cache_text(query: str, filters: Dict = None) -> str:
+    """Answer cache lookup text: the question, plus its filters when there are any."""
+    return f"{query}\n{filters_key(filters)}" if filters else query
+
+
+def answer_query(vectorstore: Chroma, query: str, filters: Dict = None) -> Dict:
+    """
+    Full pipeline (retrieve + generate), served from the answer cache when possible.
+    
+    Args:
+        vectorstore: ChromaDB vector store
+        query: User's question
+        filters: Metadata pre-filters for retrieval (part of the cache key)
+        
+    Returns:
+        {"answer": ..., "sources": [...], "cached": bool}
+    """
+    cache = get_answer_cache(vectorstore)
+    cache_text = answer_cache_text(query, filters)
+    
+    cached = cache.get(cache_text)
+    if cached is not None:
+        print(f"   ⚡ Answer served from cache")
+        return {**cached, "cached": True}
+    
+    context, sources = retrieve_context(vectorstore, query, filters=filters)
+    answer = generate_answer(query, context, sources)
+    
+    response = {"answer": answer, "sources": sources}
+    cache.set(cache_text, response)
+    
+    return {**response, "cached": False}
+
+
+# =============================================================================
+# ASYNC PIPELINE (shared AsyncAnthropic client, blocking work on executor)
+# =============================================================================
+
+async def async_generate_query_variations(query: str, api_key: str) -> List[str]:
+    """Async counterpart of generate_query_variations."""
+    client = get_async_client(api_key)
+    
+    message = await client.messages.create(
+        model=VARIATION_MODEL,
+        max_tokens=150,
+        temperature=0.7,
+        messages=[{"role": "user", "content": build_variation_prompt(query)}]
+    )
+    
+    return parse_variations(query, message.content[0].text)
+
+
+async def async_get_query_variations(vectorstore: Chroma, query: str, api_key: str) -> List[str]:
+    """Async counterpart of get_query_variations (cache lookups run on the executor)."""
+    loop = asyncio.get_running_loop()
+    pool = get_retrieval_pool()
+    cache = get_variation_cache(vectorstore)
+    
+    # Near-duplicate lookup may embed the query, so keep it off the event loop
+    cached = await loop.run_in_executor(pool, cache.get, query)
+    if cached is not None:
+        print(f"   ⚡ Query variations served from cache")
+        return [query] + cached
+    
+    query_variations = await async_generate_query_variations(query, api_key)
+    await loop.run_in_executor(pool, cache.set, query, query_variations[1:])
+    
+    return query_variations
+
+
+async def async_retrieve_context(vectorstore: Chroma, query: str, k: int = 5,
+                                 filters: Dict = None) -> tuple:
+    """
+    Async counterpart of retrieve_context.
+    
+    Original-query vector search and BM25 run on the executor while the
+    variation LLM call is awaited; no thread is held by the LLM call.
+    
+    Args:
+        vectorstore: ChromaDB vector store
+        query: User's question
+        k: Number of chunks to retrieve per query
+        filters: Metadata pre-filters (see retrieve_context)
+        
+    Returns:
+        (context_text, source_info)
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_retrieval_pool()
+    api_key = os.getenv("ANTHROPIC_API_KEY")
+    routed = route_query(vectorstore, query, filters)
+    
+    original_task = asyncio.ensure_future(async_multi_query_search(vectorstore, [query], 8, filters))
+    bm25_task = loop.run_in_executor(pool, keyword_search, vectorstore, query, 8, filters)
+    routed_task = (asyncio.ensure_future(async_multi_query_search(vectorstore, [query], 8, routed))
+                   if routed else None)
+    
+    query_variations = await async_get_query_variations(vectorstore, query, api_key)
+    
+    variation_lists = []
+    if query_variations[1:]:
+        variation_lists = await async_multi_query_search(vectorstore, query_variations[1:], 8, filters)
+    
+    ranked_lists = (await original_task) + variation_lists
+    if routed_task is not None:
+        ranked_lists += await routed_task
+    bm25_results = await bm25_task
+    
+    return assemble_context(query, query_variations, ranked_lists, bm25_results)
+
+
+async def async_generate_answer(query: str, context: str, sources: List[str]) -> str:
+    """Async counterpart of generate_answer (shared AsyncAnthropic client)."""
+    client = get_async_client(os.getenv("ANTHROPIC_API_KEY"))
+    
+    message = await client.messages.create(
+        model=ANSWER_MODEL,
+        max_tokens=ANSWER_MAX_TOKENS,
+        temperature=ANSWER_TEMPERATURE,
+        system=ANSWER_SYSTEM_PROMPT,
+        messages=[
+            {"role": "user", "content": build_answer_prompt(query, context)}
+        ]
+    )
+    
+    return message.content[0].text
+
+
+async def async_stream_answer(query: str, context: str, sources: List[str]) -> AsyncIterator[str]:
+    """Async counterpart of stream_answer."""
+    client = get_async_client(os.getenv("ANTHROPIC_API_KEY"))
+    
+    async with client.messages.stream(
+        model=ANSWER_MODEL,
+        max_tokens=ANSWER_MAX_TOKENS,
+        temperature=ANSWER_TEMPERATURE,
+        system=ANSWER_SYSTEM_PROMPT,
+        messages=[
+            {"role": "user", "content": build_answer_prompt(query, context)}
+        ]
+    ) as stream:
+        async for text in stream.text_stream:
+            yield text
+
+
+async def async_answer_query(vectorstore: Chroma, query: str, filters: Dict = None) -> Dict:
+    """Async counterpart of answer_query (cache lookups run on the executor)."""
+    loop = asyncio.get_running_loop()
+    pool = get_retrieval_pool()
+    cache = get_answer_cache(vectorstore)
+    cache_text = answer_cache_text(query, filters)
+    
+    cached = await loop.run_in_executor(pool, cache.get, cache_text)
+    if cached is not None:
+        print(f"   ⚡ Answer served from cache")
+        return {**cached, "cached": True}
+    
+    context, sources = await async_retrieve_context(vectorstore, query, filters=filters)
+    answer = await async_generate_answer(query, context, sources)
+    
+    response = {"answer": answer, "sources": sources}
+    await loop.run_in_executor(pool, cache.set, cache_text, response)
+    
+    return {**response, "cached": False}
+
+
 def format_sources(sources: List[str]) -> str:
     """Format source list for display."""
     if not sources:
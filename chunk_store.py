@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Chunk Store for SherlockRAG
+Chunk texts served from memory-mapped story files via (story_id, start, end) byte offsets
+
+Every worker maps the same processed story files, so the corpus lives once in
+the page cache instead of once per process as Python strings. Only the chunks
+actually returned by a search are decoded.
+
+Chunk IDs survive changes to chunk_size / overlap, so the store records the
+index fingerprint it was written for and is only used with that build.
+"""
+
+import os                                           # File operations
+import json                                         # Story file table
+import mmap                                         # Zero-copy file access
+import hashlib                                      # Stale-file detection
+from typing import Dict, List, Optional, Sequence   # Type hints
+import numpy as np                                  # Offset table
+
+from index_manifest import chunk_id_of              # Stable chunk IDs
+
+
+# Written next to the Chroma database by build_index.py
+OFFSETS_FILENAME = "chunk_offsets.npy"              # (chunk_id, story_id, start, end) per chunk
+STORES_FILENAME = "chunk_store.json"                # Index fingerprint + story_id -> file path + SHA-1
+
+
+def file_sha1(path: str) -> str:
+    """SHA-1 of a file's bytes."""
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def locate_chunks(story_bytes: bytes, chunk_texts: List[str]) -> List[tuple]:
+    """
+    Byte offsets of each chunk inside its story file.
+
+    Chunks are searched in order from just after the previous chunk's start,
+    so overlapping chunks and repeated passages resolve to the right place.
+
+    Args:
+        story_bytes: Raw story file contents (UTF-8)
+        chunk_texts: The story's chunks, in chunk_index order
+
+    Returns:
+        (start, end) byte offsets per chunk
+    """
+    story_text = story_bytes.decode('utf-8')
+    offsets = []
+    cursor = 0              # Character position
+    byte_cursor = 0         # Byte position of story_text[:cursor]
+
+    for text in chunk_texts:
+        start = story_text.find(text, cursor)
+        if start < 0:
+            raise ValueError(f"Chunk not found in story file: {text[:60]!r}")
+
+        byte_start = byte_cursor + len(story_text[cursor:start].encode('utf-8'))
+        byte_end = byte_start + len(text.encode('utf-8'))
+        offsets.append((byte_start, byte_end))
+
+        cursor, byte_cursor = start + 1, byte_start + len(story_text[start].encode('utf-8'))
+
+    return offsets
+
+
+def write_chunk_store(persist_directory: str, stories_dir: str,
+                      texts: List[str], metadatas: List[Dict], fingerprint: str) -> int:
+    """
+    Record where every chunk lives in the processed story files.
+
+    Story paths are stored relative to persist_directory, so the index can
+    be loaded from any working directory.
+
+    Args:
+        persist_directory: Index directory
+        stories_dir: Directory of processed story files (as read by build_index.py)
+        texts: Chunk texts
+        metadatas: Chunk metadata dicts (need story_id, chunk_index, filename)
+        fingerprint: Fingerprint of the index build these chunks belong to
+
+    Returns:
+        Number of chunks recorded
+    """
+    by_story: Dict[int, List[int]] = {}
+    for i, meta in enumerate(metadatas):
+        by_story.setdefault(int(meta['story_id']), []).append(i)
+
+    rows = []
+    stories = {}
+    for story_id, indices in sorted(by_story.items()):
+        indices.sort(key=lambda i: metadatas[i]['chunk_index'])
+        path = os.path.join(stories_dir, metadatas[indices[0]]['filename'])
+        with open(path, 'rb') as f:
+            story_bytes = f.read()
+
+        offsets = locate_chunks(story_bytes, [texts[i] for i in indices])
+        for i, (start, end) in zip(indices, offsets):
+            rows.append((chunk_id_of(metadatas[i]), story_id, start, end))
+
+        stories[str(story_id)] = {
+            'path': os.path.relpath(path, persist_directory),
+            'sha1': hashlib.sha1(story_bytes).hexdigest(),
+        }
+
+    rows.sort()
+    os.makedirs(persist_directory, exist_ok=True)
+    np.save(os.path.join(persist_directory, OFFSETS_FILENAME), np.array(rows, dtype=np.int64).reshape(-1, 4))
+    with open(os.path.join(persist_directory, STORES_FILENAME), 'w') as f:
+        json.dump({'fingerprint': fingerprint, 'stories': stories}, f, indent=2)
+
+    return len(rows)
+
+
+class ChunkStore(Sequence):
+    """
+    Read-only sequence of chunk texts, decoded on access from mmap'd story files.
+
+    Rows follow the order given by ordered() (or chunk ID order by default),
+    so a store can stand in for the documents list of KeywordIndex or
+    FlatVectorStore.
+    """
+
+    def __init__(self, offsets: np.ndarray, maps: Dict[int, mmap.mmap]):
+        """
+        Args:
+            offsets: (num_chunks, 4) rows of (chunk_id, story_id, start, end)
+            maps: story_id -> memory map of its story file
+        """
+        self.offsets = offsets
+        self.maps = maps
+        self._row_of = {int(chunk_id): row for row, chunk_id in enumerate(offsets[:, 0])}
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        _, story_id, start, end = self.offsets[row]
+        return self.maps[int(story_id)][int(start):int(end)].decode('utf-8')
+
+    def __contains__(self, chunk_id) -> bool:
+        return chunk_id in self._row_of
+
+    def text(self, chunk_id: int) -> str:
+        """Text of a chunk by chunk ID."""
+        return self[self._row_of[int(chunk_id)]]
+
+    def ordered(self, metadatas: List[Dict]) -> 'ChunkStore':
+        """
+        View of the store with rows in the order of the given chunks
+        (same maps, permuted offsets).
+
+        Raises:
+            KeyError: If a chunk is not in the store
+        """
+        rows = [self._row_of[chunk_id_of(meta)] for meta in metadatas]
+        return ChunkStore(self.offsets[rows], self.maps)
+
+
+def load_chunk_store(persist_directory: str, fingerprint: Optional[str]) -> Optional[ChunkStore]:
+    """
+    Map the story files of an index's chunk store.
+
+    Args:
+        persist_directory: Index directory
+        fingerprint: Fingerprint of the loaded index build (None = unknown)
+
+    Returns None (callers keep texts in memory) if the index has no chunk
+    store, the store was written for a different build, or a story file
+    changed since the index was built.
+    """
+    offsets_path = os.path.join(persist_directory, OFFSETS_FILENAME)
+    stores_path = os.path.join(persist_directory, STORES_FILENAME)
+    if not (os.path.exists(offsets_path) and os.path.exists(stores_path)):
+        return None
+
+    with open(stores_path, 'r') as f:
+        store = json.load(f)
+    if fingerprint is None or store.get('fingerprint') != fingerprint:
+        print(f"   ⚠️  Chunk store was written for index {store.get('fingerprint')}, not {fingerprint}")
+        return None
+
+    maps = {}
+    for story_id, story in store['stories'].items():
+        path = os.path.join(persist_directory, story['path'])
+        if not os.path.exists(path) or file_sha1(path) != story['sha1']:
+            print(f"   ⚠️  {path} changed since the index was built")
+            return None
+        with open(path, 'rb') as f:
+            maps[int(story_id)] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    return ChunkStore(np.load(offsets_path), maps)
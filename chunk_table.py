@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Chunk Table for SherlockRAG
+Columnar per-chunk metadata (NumPy structured array) with vectorized pre-filters
+
+One row per chunk, in chunk ID order (the flat index's row order):
+story_id, chunk_index, year, title, collection, type and the chunk's byte
+offsets in its story file. Retrieval turns a filter dict such as
+{"collection": "Case-Book", "year_min": 1910} into a boolean row mask
+before scoring, instead of over-fetching and discarding.
+"""
+
+import os                                           # File operations
+import json                                         # Canonical filter keys
+from typing import Dict, List, Optional             # Type hints
+import numpy as np                                  # Columnar storage
+
+from index_manifest import chunk_id_of              # Stable chunk IDs
+
+
+# Written next to the Chroma database by build_index.py
+TABLE_FILENAME = "chunk_table.npy"
+
+CHUNK_TABLE_DTYPE = np.dtype([
+    ('chunk_id', '<i8'),
+    ('story_id', '<i4'),
+    ('chunk_index', '<i4'),
+    ('year', '<i2'),                                # -1 if unknown
+    ('title', '<U96'),
+    ('collection', '<U32'),
+    ('type', '<U16'),
+    ('start', '<i8'),                               # Byte offsets in the story file (-1 if unknown)
+    ('end', '<i8'),
+])
+
+# Filter keys accepted by ChunkTable.mask (and retrieve_context's filters argument)
+FILTER_KEYS = ('story_id', 'title', 'collection', 'type', 'year_min', 'year_max')
+
+# Value type of each filter: a scalar of this type, or a non-empty list of them
+# for the match filters (year_min / year_max take a single value)
+FILTER_TYPES = {'story_id': int, 'title': str, 'collection': str, 'type': str,
+                'year_min': int, 'year_max': int}
+MATCH_FILTERS = ('story_id', 'title', 'collection', 'type')
+
+
+def build_chunk_table(metadatas: List[Dict], offsets: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Columnar table of chunk metadata.
+
+    Args:
+        metadatas: Chunk metadata dicts (story fields joined on at load_stories time)
+        offsets: Optional (chunk_id, story_id, start, end) rows from the chunk store
+
+    Returns:
+        Structured array, one row per chunk, sorted by chunk ID
+    """
+    spans = {int(row[0]): (int(row[2]), int(row[3])) for row in offsets} if offsets is not None else {}
+
+    table = np.empty(len(metadatas), dtype=CHUNK_TABLE_DTYPE)
+    for row, meta in enumerate(metadatas):
+        chunk_id = chunk_id_of(meta)
+        year = meta.get('year')
+        table[row] = (
+            chunk_id,
+            meta.get('story_id', -1),
+            meta.get('chunk_index', -1),
+            year if year is not None else -1,
+            meta.get('title', ''),
+            meta.get('collection', ''),
+            meta.get('type', ''),
+            *spans.get(chunk_id, (-1, -1)),
+        )
+
+    return table[np.argsort(table['chunk_id'], kind='stable')]
+
+
+def write_chunk_table(persist_directory: str, metadatas: List[Dict],
+                      offsets: Optional[np.ndarray] = None) -> int:
+    """Build and save the chunk table; returns its row count."""
+    table = build_chunk_table(metadatas, offsets)
+    os.makedirs(persist_directory, exist_ok=True)
+    np.save(os.path.join(persist_directory, TABLE_FILENAME), table)
+    return len(table)
+
+
+def filters_key(filters: Optional[Dict]) -> str:
+    """Canonical text form of a filter dict (for cache keys); '' when unfiltered."""
+    return json.dumps(filters, sort_keys=True) if filters else ""
+
+
+def _as_list(value) -> list:
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+def _is_scalar(value, kind: type) -> bool:
+    return isinstance(value, kind) and not isinstance(value, bool)
+
+
+def validate_filters(filters: Dict):
+    """
+    Check a filter dict as sent by an API client.
+
+    Raises:
+        ValueError: If filters is not a dict, has an unknown key, or a value
+            is not a scalar of the field's type (int for story_id / year_min /
+            year_max, str otherwise); story_id, title, collection and type
+            also accept a non-empty list of such scalars
+    """
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be an object")
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown filter(s): {', '.join(sorted(unknown))}")
+    for key, value in filters.items():
+        kind = FILTER_TYPES[key]
+        if key in MATCH_FILTERS and isinstance(value, list):
+            valid = bool(value) and all(_is_scalar(item, kind) for item in value)
+        else:
+            valid = _is_scalar(value, kind)
+        if not valid:
+            name = 'an integer' if kind is int else 'a string'
+            raise ValueError(f"{key} must be {name}"
+                             + (" or a non-empty list of them" if key in MATCH_FILTERS else ""))
+
+
+class ChunkTable:
+    """Chunk metadata columns with vectorized row masks."""
+
+    def __init__(self, table: np.ndarray):
+        """
+        Args:
+            table: Structured array with CHUNK_TABLE_DTYPE fields
+        """
+        self.table = table
+        self._row_of = {int(chunk_id): row for row, chunk_id in enumerate(table['chunk_id'])}
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.table[column]
+
+    def ordered(self, metadatas: List[Dict]) -> 'ChunkTable':
+        """
+        Table with rows in the order of the given chunks.
+
+        Raises:
+            KeyError: If a chunk is not in the table
+        """
+        rows = [self._row_of[chunk_id_of(meta)] for meta in metadatas]
+        return ChunkTable(self.table[rows])
+
+    def mask(self, filters: Optional[Dict]) -> Optional[np.ndarray]:
+        """
+        Boolean row mask for a filter dict (None = no filtering).
+
+        Args:
+            filters: Any of story_id, title, collection, type (a value or a
+                list of values) and year_min / year_max (inclusive)
+
+        Raises:
+            ValueError: On an unknown filter key
+        """
+        if not filters:
+            return None
+        validate_filters(filters)
+
+        mask = np.ones(len(self.table), dtype=bool)
+        for column in ('story_id', 'title', 'collection', 'type'):
+            if column in filters:
+                mask &= np.isin(self.table[column], _as_list(filters[column]))
+        if 'year_min' in filters:
+            mask &= self.table['year'] >= int(filters['year_min'])
+        if 'year_max' in filters:
+            mask &= (self.table['year'] <= int(filters['year_max'])) & (self.table['year'] >= 0)
+
+        return mask
+
+
+def chroma_where(filters: Optional[Dict]) -> Optional[Dict]:
+    """The same filters as a Chroma metadata `where` clause (None = no filtering)."""
+    if not filters:
+        return None
+    validate_filters(filters)
+
+    clauses = []
+    for column in ('story_id', 'title', 'collection', 'type'):
+        if column in filters:
+            clauses.append({column: {'$in': _as_list(filters[column])}})
+    if 'year_min' in filters:
+        clauses.append({'year': {'$gte': int(filters['year_min'])}})
+    if 'year_max' in filters:
+        clauses.append({'year': {'$lte': int(filters['year_max'])}})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+
+def load_chunk_table(persist_directory: str) -> Optional[ChunkTable]:
+    """Load an index's chunk table, or None if it was built without one."""
+    path = os.path.join(persist_directory, TABLE_FILENAME)
+    if not os.path.exists(path):
+        return None
+    return ChunkTable(np.load(path))
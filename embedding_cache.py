@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Embedding Cache for SherlockRAG
+Query-embedding cache: bounded in-memory LRU + optional memory-mapped disk tier
+"""
+
+import os                                           # File operations
+import fcntl                                        # Cross-process append lock
+import glob                                         # Stale disk-tier files
+import hashlib                                      # Cache keys
+import threading                                    # Thread-safe LRU (Flask is threaded)
+from collections import OrderedDict                 # LRU ordering
+from typing import List, Dict, Optional             # Type hints
+import numpy as np                                  # Vector storage
+from langchain_core.embeddings import Embeddings    # LangChain embedding interface
+
+
+def normalize_query(text: str) -> str:
+    """
+    Normalize query text for cache keys.
+
+    Collapses whitespace and lowercases (all-MiniLM-L6-v2 is uncased,
+    so case never changes the embedding).
+    """
+    return " ".join(text.split()).lower()
+
+
+def cache_key(text: str, model_name: str) -> bytes:
+    """Hex SHA-1 of model name + normalized text."""
+    return hashlib.sha1(f"{model_name}\n{normalize_query(text)}".encode('utf-8')).hexdigest().encode('ascii')
+
+
+class DiskEmbeddingStore:
+    """
+    Append-only file of fixed-size (key, vector) records, read through np.memmap.
+
+    Survives restarts and is shared through the page cache by every process
+    that opens it. Rows appended by other processes are picked up on reopen.
+
+    Appends hold an exclusive flock, so concurrent workers never record
+    stale row numbers; a torn record left by a killed process is cut off
+    before the next append (and on open), and every read checks the key.
+    """
+
+    def __init__(self, path: str, dim: int):
+        """
+        Open (or create) the store.
+
+        Args:
+            path: Record file path
+            dim: Embedding dimensions
+        """
+        self.path = path
+        self.dim = dim
+        self.record = np.dtype([('key', 'S40'), ('vector', '<f4', (dim,))])
+        self.rows: Dict[bytes, int] = {}
+        self._mmap = None
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(self.path, 'ab') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                self._truncate_partial(f)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        self._remap()
+
+        if self._mmap is not None:
+            for row, key in enumerate(self._mmap['key']):
+                self.rows[bytes(key)] = row
+
+    def _truncate_partial(self, f) -> int:
+        """Cut the (locked) file back to whole records; returns the record count."""
+        size = os.fstat(f.fileno()).st_size
+        num_rows = size // self.record.itemsize
+        if size != num_rows * self.record.itemsize:
+            f.truncate(num_rows * self.record.itemsize)
+        return num_rows
+
+    def _remap(self):
+        """Map every complete record currently in the file."""
+        num_rows = os.path.getsize(self.path) // self.record.itemsize if os.path.exists(self.path) else 0
+        if num_rows:
+            self._mmap = np.memmap(self.path, dtype=self.record, mode='r', shape=(num_rows,))
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        """Return a copy of the cached vector, or None."""
+        row = self.rows.get(key)
+        if row is None:
+            return None
+        if self._mmap is None or row >= len(self._mmap):
+            self._remap()
+        if self._mmap is None or row >= len(self._mmap) or bytes(self._mmap[row]['key']) != key:
+            del self.rows[key]                      # Stale row number: treat as a miss
+            return None
+        return np.array(self._mmap[row]['vector'])
+
+    def put_many(self, keys: List[bytes], vectors: np.ndarray):
+        """Append new records in a single write."""
+        new = [(key, vector) for key, vector in zip(keys, vectors) if key not in self.rows]
+        if not new:
+            return
+
+        records = np.empty(len(new), dtype=self.record)
+        for i, (key, vector) in enumerate(new):
+            records[i] = (key, vector)
+
+        with open(self.path, 'ab') as f:
+            # Row numbers are only valid while no other worker can append
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                start_row = self._truncate_partial(f)
+                f.write(records.tobytes())
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+        for i, (key, _) in enumerate(new):
+            self.rows[key] = start_row + i
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model with an LRU cache (and optional disk tier).
+
+    Drop-in replacement for the embedding function handed to Chroma, so
+    similarity_search (embed_query) and batched search (embed_documents)
+    both skip the encoder for texts seen before.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str,
+                 max_entries: int = 10000, cache_dir: Optional[str] = None,
+                 dim: int = 384, fingerprint: str = ""):
+        """
+        Args:
+            embeddings: Underlying embedding model
+            model_name: Model name (part of every cache key)
+            max_entries: In-memory LRU size bound
+            cache_dir: Directory for the on-disk tier (None = memory only)
+            dim: Embedding dimensions (needed to map the disk tier)
+            fingerprint: Index fingerprint the disk tier belongs to
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.dim = dim
+        self.memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self.disk = None
+        self.fingerprint = fingerprint
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if cache_dir:
+            self.attach_disk(cache_dir, fingerprint)
+
+    def attach_disk(self, cache_dir: str, fingerprint: str = ""):
+        """
+        Open the on-disk tier for an index build.
+
+        Each fingerprint gets its own record file; files left by other
+        builds are deleted, and the memory tier is cleared if the
+        fingerprint changed.
+
+        Args:
+            cache_dir: Directory for the on-disk tier
+            fingerprint: Index fingerprint ("" = not index-bound)
+        """
+        filename = f"query_embeddings-{fingerprint}.bin" if fingerprint else "query_embeddings.bin"
+        path = os.path.join(cache_dir, filename)
+
+        for stale in glob.glob(os.path.join(cache_dir, "query_embeddings*.bin")):
+            if os.path.abspath(stale) != os.path.abspath(path):
+                os.remove(stale)
+
+        with self._lock:
+            if fingerprint != self.fingerprint:
+                self.memory.clear()
+            self.fingerprint = fingerprint
+            self.disk = DiskEmbeddingStore(path, self.dim)
+
+    def _remember(self, key: bytes, vector: np.ndarray):
+        """Insert into the LRU tier, evicting the least recently used entry."""
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts, encoding only cache misses (in one batch)."""
+        keys = [cache_key(text, self.model_name) for text in texts]
+        vectors: List[Optional[np.ndarray]] = [None] * len(texts)
+        missing = []
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self.memory.get(key)
+                if vector is not None:
+                    self.memory.move_to_end(key)
+                    self.memory_hits += 1
+                    vectors[i] = vector
+                    continue
+
+                vector = self.disk.get(key) if self.disk is not None else None
+                if vector is not None:
+                    self._remember(key, vector)
+                    self.disk_hits += 1
+                    vectors[i] = vector
+                else:
+                    missing.append(i)
+                    self.misses += 1
+
+        if missing:
+            # One encoder pass for every miss (duplicates encoded once)
+            unique = list(dict.fromkeys(keys[i] for i in missing))
+            texts_by_key = {keys[i]: texts[i] for i in missing}
+            computed = np.asarray(
+                self.embeddings.embed_documents([texts_by_key[key] for key in unique]),
+                dtype=np.float32
+            )
+            computed_by_key = dict(zip(unique, computed))
+
+            with self._lock:
+                for key, vector in computed_by_key.items():
+                    self._remember(key, vector)
+                if self.disk is not None:
+                    self.disk.put_many(unique, computed)
+
+            for i in missing:
+                vectors[i] = computed_by_key[keys[i]]
+
+        return [vector.tolist() for vector in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query (through the same cache)."""
+        return self.embed_documents([text])[0]
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for monitoring."""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            'memory_entries': len(self.memory),
+            'disk_entries': len(self.disk) if self.disk is not None else 0,
+            'fingerprint': self.fingerprint,
+        }
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Embedding Pipeline for SherlockRAG
+Parallel, batched chunk encoding for index builds
+
+Chunks are streamed in fixed-size batches to a pool of encoder processes,
+each with its own sentence-transformers model and a pinned torch thread
+count. Workers write their rows straight into a preallocated memory-mapped
+matrix, so only row offsets travel back to the parent.
+"""
+
+import os                                           # CPU count
+import time                                         # Throughput
+import multiprocessing as mp                        # Encoder pool
+from typing import List, Optional, Tuple            # Type hints
+import numpy as np                                  # Memory-mapped matrix
+from tqdm import tqdm                               # Progress bar
+
+
+# Texts per encoder call (one worker task)
+BATCH_SIZE = 256
+
+# torch threads per worker (workers = cpu_count // TORCH_THREADS)
+TORCH_THREADS = 2
+
+# Per-process state set by _init_worker
+_model = None
+_output_path = None
+
+
+def default_workers(torch_threads: int = TORCH_THREADS) -> int:
+    """Encoder processes that fill the machine at torch_threads each."""
+    return max(1, (os.cpu_count() or 1) // torch_threads)
+
+
+def _init_worker(model_name: str, torch_threads: int, output_path: str):
+    """Load one model per worker, pinned to torch_threads intra-op threads."""
+    global _model, _output_path
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(torch_threads)
+    _model = SentenceTransformer(model_name, device='cpu')
+    _output_path = output_path
+
+
+def _encode_batch(task: Tuple[int, List[str]]) -> int:
+    """Encode one batch and write it into the shared matrix; returns the row count."""
+    start, texts = task
+    vectors = _model.encode(texts, batch_size=len(texts), normalize_embeddings=True,
+                            convert_to_numpy=True, show_progress_bar=False)
+
+    matrix = np.load(_output_path, mmap_mode='r+')
+    matrix[start:start + len(texts)] = vectors
+    matrix.flush()
+    del matrix
+
+    return len(texts)
+
+
+def encode_parallel(texts: List[str], output_path: str, model_name: str, dim: int,
+                    workers: Optional[int] = None, batch_size: int = BATCH_SIZE,
+                    torch_threads: int = TORCH_THREADS) -> np.ndarray:
+    """
+    Encode texts across a process pool into a memory-mapped .npy matrix.
+
+    Args:
+        texts: Texts to encode (row i of the matrix is texts[i])
+        output_path: .npy file to preallocate and fill
+        model_name: sentence-transformers model (same one chatbot.py queries with)
+        dim: Embedding dimensions
+        workers: Encoder processes (default: cpu_count // torch_threads)
+        batch_size: Texts per worker task
+        torch_threads: torch intra-op threads per worker
+
+    Returns:
+        The filled matrix, memory-mapped read-only, (len(texts), dim) float32
+    """
+    workers = workers or default_workers(torch_threads)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    matrix = np.lib.format.open_memmap(output_path, mode='w+', dtype=np.float32, shape=(len(texts), dim))
+    del matrix                                      # Header + zeroed rows are on disk
+
+    tasks = ((start, texts[start:start + batch_size]) for start in range(0, len(texts), batch_size))
+
+    print(f"   ⚙️  Encoding {len(texts):,} chunks: {workers} workers x {torch_threads} threads, batch {batch_size}")
+    started = time.perf_counter()
+
+    # spawn: torch and forked OpenMP thread pools don't mix
+    context = mp.get_context('spawn')
+    with context.Pool(workers, initializer=_init_worker,
+                      initargs=(model_name, torch_threads, output_path)) as pool:
+        with tqdm(total=len(texts), unit='chunk', leave=False) as progress:
+            for count in pool.imap_unordered(_encode_batch, tasks):
+                progress.update(count)
+
+    elapsed = time.perf_counter() - started
+    print(f"   ⚡ {len(texts) / max(elapsed, 1e-9):,.0f} chunks/sec ({elapsed:.1f}s)")
+
+    return np.load(output_path, mmap_mode='r')
@@ -0,0 +1,48 @@
+"""
+Gunicorn config for the SherlockRAG ASGI server
+
+    gunicorn -c gunicorn.conf.py asgi_server:app
+
+The app (embedding model + keyword index) is loaded once in the parent
+(preload_app) and workers are forked from it, so they share those pages
+copy-on-write instead of each loading a private copy.
+
+VECTOR_BACKEND defaults to "numpy" here: the memory-mapped flat index is
+shared through the page cache. With VECTOR_BACKEND=chroma (or an index
+without flat/ files, which falls back to Chroma) every worker reopens
+Chroma and loads its own copy of the HNSW index.
+"""
+
+import gc
+import os
+import multiprocessing
+
+from dotenv import load_dotenv
+
+# Read by chatbot.py when the app is preloaded. .env is loaded first, so a
+# VECTOR_BACKEND set there (or in the environment) wins over this default
+load_dotenv()
+os.environ.setdefault("VECTOR_BACKEND", "numpy")
+
+bind = os.getenv("BIND", "127.0.0.1:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+preload_app = True            # Load model + index in the parent, then fork
+graceful_timeout = 30         # Seconds for in-flight requests on SIGTERM
+timeout = 120                 # Kill workers stuck longer than this
+keepalive = 5
+
+# Torch intra-op threads per worker (workers x threads should fit the cores)
+TORCH_THREADS_PER_WORKER = int(os.getenv("TORCH_THREADS_PER_WORKER", "1"))
+
+
+def pre_fork(server, worker):
+    """Move preloaded objects out of GC tracking so collections don't dirty shared pages."""
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """Pin torch threads in each worker."""
+    import torch
+    torch.set_num_threads(TORCH_THREADS_PER_WORKER)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Index Manifest for SherlockRAG
+Identifies an index build (embedding model, chunk count, content hash, build time)
+and the chunks inside it (stable integer chunk IDs)
+"""
+
+import os                                           # File operations
+import json                                         # Manifest file
+import hashlib                                      # Content hash / fingerprint
+from datetime import datetime, timezone             # Build time
+from typing import Dict, List, Optional             # Type hints
+
+
+# Written next to the Chroma database by build_index.py
+MANIFEST_FILENAME = "index_manifest.json"
+
+# chunk_id = story_id * CHUNK_ID_STRIDE + chunk_index (no story has 10,000 chunks)
+CHUNK_ID_STRIDE = 10000
+
+
+def make_chunk_id(story_id: int, chunk_index: int) -> int:
+    """Stable integer ID of a chunk: story id + chunk ordinal."""
+    return int(story_id) * CHUNK_ID_STRIDE + int(chunk_index)
+
+
+def chunk_id_of(metadata: Dict) -> Optional[int]:
+    """
+    Chunk ID from metadata, derived from story_id/chunk_index for indexes
+    built before chunk IDs were stored. None if neither is available.
+    """
+    chunk_id = metadata.get('chunk_id')
+    if chunk_id is not None:
+        return int(chunk_id)
+    if metadata.get('story_id') is not None and metadata.get('chunk_index') is not None:
+        return make_chunk_id(metadata['story_id'], metadata['chunk_index'])
+    return None
+
+
+def chunk_digest(text: str, metadata: Dict) -> str:
+    """SHA-1 of one chunk's text and identifying metadata."""
+    identity = f"{metadata.get('story_id', '')}\n{metadata.get('chunk_index', '')}\n{text}"
+    return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+
+def content_hash(texts: List[str], metadatas: List[Dict]) -> str:
+    """
+    Order-independent hash of every chunk in the index.
+
+    Chunk digests are sorted before hashing, so the result does not depend
+    on the order Chroma happens to return rows in.
+    """
+    digests = sorted(chunk_digest(text, meta or {}) for text, meta in zip(texts, metadatas))
+    return hashlib.sha256("\n".join(digests).encode('ascii')).hexdigest()
+
+
+def make_fingerprint(embedding_model: str, chunk_count: int, chunks_hash: str) -> str:
+    """Short fingerprint of everything that changes retrieval results."""
+    identity = f"{embedding_model}\n{chunk_count}\n{chunks_hash}"
+    return hashlib.sha1(identity.encode('utf-8')).hexdigest()[:16]
+
+
+def build_manifest(embedding_model: str, texts: List[str], metadatas: List[Dict],
+                   built_at: Optional[str] = None) -> Dict:
+    """
+    Describe an index build.
+
+    Args:
+        embedding_model: Embedding model used for the chunk vectors
+        texts: Chunk texts
+        metadatas: Chunk metadata dicts (same order as texts)
+        built_at: ISO build time (None if unknown)
+
+    Returns:
+        Manifest dict (including its fingerprint)
+    """
+    chunks_hash = content_hash(texts, metadatas)
+    return {
+        'embedding_model': embedding_model,
+        'chunk_count': len(texts),
+        'content_hash': chunks_hash,
+        'built_at': built_at,
+        'fingerprint': make_fingerprint(embedding_model, len(texts), chunks_hash),
+    }
+
+
+def write_manifest(persist_directory: str, embedding_model: str,
+                   texts: List[str], metadatas: List[Dict]) -> Dict:
+    """
+    Write the manifest for a freshly built index.
+
+    Args:
+        persist_directory: Index directory
+        embedding_model: Embedding model used for the chunk vectors
+        texts: Chunk texts
+        metadatas: Chunk metadata dicts (same order as texts)
+
+    Returns:
+        The manifest written
+    """
+    built_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    manifest = build_manifest(embedding_model, texts, metadatas, built_at=built_at)
+
+    os.makedirs(persist_directory, exist_ok=True)
+    with open(os.path.join(persist_directory, MANIFEST_FILENAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
+
+
+def load_manifest(persist_directory: str) -> Optional[Dict]:
+    """Read the manifest of an index, or None if it was built without one."""
+    path = os.path.join(persist_directory, MANIFEST_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Keyword Index for SherlockRAG
+In-memory BM25F lexical index over chunk texts (with story-title boosting)
+"""
+
+import re                                           # Tokenization
+import math                                         # IDF
+from collections import Counter                     # Term frequencies
+from typing import List, Dict, Optional, Tuple      # Type hints
+import numpy as np                                  # Array-backed postings
+
+
+# Lowercase alphanumeric runs ("red-headed" -> "red", "headed")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Very common words carry no lexical signal (and have the longest postings)
+STOPWORDS = {
+    'a', 'about', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'did', 'do',
+    'does', 'for', 'from', 'had', 'has', 'have', 'he', 'her', 'his', 'how',
+    'i', 'in', 'is', 'it', 'me', 'of', 'on', 'or', 's', 'she', 'tell', 'that',
+    'the', 'this', 'to', 'was', 'what', 'when', 'where', 'which', 'who',
+    'why', 'with', 'you',
+}
+
+# Query-side spelling variants, applied to every query.
+# Add entries here instead of writing new keyword rules.
+QUERY_EXPANSIONS = {
+    'mustache': ['moustache'],                      # American -> British spelling
+}
+
+# Related terms added only when the query also contains the context term
+# (context term, query term) -> added terms
+WATSON_WOUND_TERMS = ['shoulder', 'jezail', 'leg', 'bullet', 'struck']  # Watson's Afghan wound
+CONTEXT_EXPANSIONS = {
+    ('watson', 'wound'): WATSON_WOUND_TERMS,
+    ('watson', 'injury'): WATSON_WOUND_TERMS,
+    ('watson', 'injured'): WATSON_WOUND_TERMS,
+    ('watson', 'shot'): WATSON_WOUND_TERMS,
+    ('watson', 'hurt'): WATSON_WOUND_TERMS,
+}
+
+# BM25F parameters
+K1 = 1.2
+FIELDS = {
+    # field: (weight, length normalization b)
+    'text': (1.0, 0.75),
+    'title': (3.0, 0.0),                            # Title boost (no length norm)
+}
+
+
+def stem(token: str) -> str:
+    """Light suffix stripping so 'wounded'/'wound' and 'moustaches'/'moustache' match."""
+    if len(token) > 5 and token.endswith('ing'):
+        token = token[:-3]
+    elif len(token) > 4 and token.endswith('ed'):
+        token = token[:-2]
+    elif len(token) > 4 and token.endswith('ies'):
+        token = token[:-3] + 'y'
+    elif len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        token = token[:-1]
+    if len(token) > 5 and token.endswith('e'):
+        token = token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, split into alphanumeric tokens, drop stopwords and stem."""
+    return [stem(t) for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def expand_query(tokens: List[str]) -> List[str]:
+    """Add QUERY_EXPANSIONS / CONTEXT_EXPANSIONS terms for the (stemmed) query tokens."""
+    expanded = list(tokens)
+    present = set(tokens)
+    for token in tokens:
+        expanded.extend(_STEMMED_EXPANSIONS.get(token, []))
+    for (context, word), terms in _STEMMED_CONTEXT_EXPANSIONS.items():
+        if context in present and word in present:
+            expanded.extend(terms)
+    return expanded
+
+
+_STEMMED_EXPANSIONS = {
+    stem(word): [stem(term) for term in terms] for word, terms in QUERY_EXPANSIONS.items()
+}
+
+_STEMMED_CONTEXT_EXPANSIONS = {
+    (stem(context), stem(word)): [stem(term) for term in terms]
+    for (context, word), terms in CONTEXT_EXPANSIONS.items()
+}
+
+
+class KeywordIndex:
+    """
+    BM25F index over all chunks, built once at load time.
+
+    Each term maps to two parallel arrays: chunk positions (int32) and the
+    precomputed saturated BM25F term weight for that chunk (float32). Document
+    lengths are fixed at build time, so a query is just a few scatter-adds
+    into a score array and an argpartition -- no scan over chunk texts.
+    """
+
+    def __init__(self, documents: List[str], metadatas: List[Dict]):
+        """
+        Build the index.
+
+        Args:
+            documents: Chunk texts (in collection order)
+            metadatas: Chunk metadata dicts (same order as documents)
+        """
+        self.documents = documents
+        self.metadatas = metadatas
+
+        num_docs = len(documents)
+        text_tfs = [Counter(tokenize(text)) for text in documents]
+        title_tfs = [Counter(tokenize(meta.get('title', ''))) for meta in metadatas]
+
+        # Precomputed field lengths
+        self.doc_lengths = np.array([sum(tf.values()) for tf in text_tfs], dtype=np.float32)
+        title_lengths = np.array([sum(tf.values()) for tf in title_tfs], dtype=np.float32)
+        field_lengths = {'text': self.doc_lengths, 'title': title_lengths}
+
+        # Per-field length normalization: 1 - b + b * len / avg_len
+        norms = {}
+        for field, (_, b) in FIELDS.items():
+            lengths = field_lengths[field]
+            avg_length = float(lengths.mean()) if num_docs and lengths.mean() > 0 else 1.0
+            norms[field] = 1.0 - b + b * lengths / avg_length
+
+        # Collect weighted pseudo term frequencies per term
+        raw_postings: Dict[str, Dict[int, float]] = {}
+        for field, tfs in (('text', text_tfs), ('title', title_tfs)):
+            weight = FIELDS[field][0]
+            field_norms = norms[field]
+            for doc_id, tf in enumerate(tfs):
+                for term, count in tf.items():
+                    postings = raw_postings.setdefault(term, {})
+                    postings[doc_id] = postings.get(doc_id, 0.0) + weight * count / field_norms[doc_id]
+
+        # Freeze into arrays: term -> (doc ids, saturated weights), plus idf
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.idf: Dict[str, float] = {}
+        for term, postings in raw_postings.items():
+            doc_ids = np.fromiter(postings.keys(), dtype=np.int32, count=len(postings))
+            tf = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            order = np.argsort(doc_ids)
+            tf = tf[order]
+            self.postings[term] = (doc_ids[order], (tf * (K1 + 1) / (tf + K1)).astype(np.float32))
+            df = len(postings)
+            self.idf[term] = math.log(1.0 + (num_docs - df + 0.5) / (df + 0.5))
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def search(self, query: str, k: int = 8, mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Rank chunks for a query with BM25F.
+
+        Args:
+            query: Free-text query
+            k: Number of chunks to return
+            mask: Optional boolean chunk mask; other chunks never score
+
+        Returns:
+            List of (chunk position, score), best first
+        """
+        terms = [t for t in set(expand_query(tokenize(query))) if t in self.postings]
+
+        if not terms:
+            return []
+
+        scores = np.zeros(len(self.documents), dtype=np.float32)
+        for term in terms:
+            doc_ids, weights = self.postings[term]
+            scores[doc_ids] += self.idf[term] * weights
+
+        if mask is not None:
+            scores[~mask] = 0.0
+
+        # Top-k without sorting every chunk
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [(int(doc_id), float(scores[doc_id])) for doc_id in top]
+
+    def get(self, doc_id: int) -> Tuple[str, Dict]:
+        """Return (text, metadata) for a chunk position."""
+        return self.documents[doc_id], self.metadatas[doc_id]
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+LLM Client Registry for SherlockRAG
+Shared, pooled Anthropic clients (HTTP keep-alive) with connection-reuse counters
+"""
+
+import os                                           # Environment variables
+import random                                       # Backoff jitter
+import threading                                    # Thread-safe registry
+from typing import Dict                             # Type hints
+import httpx                                        # HTTP pool settings
+import anthropic                                    # Anthropic SDK
+
+
+# Pool / timeout / retry settings (override via environment)
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))    # seconds idle before close
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "120"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_INITIAL_DELAY = float(os.getenv("LLM_RETRY_INITIAL_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+
+
+class ConnectionStats:
+    """
+    Counts HTTP requests vs. new TCP connections / TLS handshakes.
+
+    Fed by httpcore trace events, so `reused_connections` shows how many
+    requests rode an existing keep-alive connection.
+    """
+
+    def __init__(self):
+        self.clients_created = 0
+        self.requests = 0
+        self.new_connections = 0
+        self.tls_handshakes = 0
+        self._lock = threading.Lock()
+
+    def record(self, event_name: str):
+        """Count one trace event."""
+        with self._lock:
+            if event_name == "connection.connect_tcp.complete":
+                self.new_connections += 1
+            elif event_name == "connection.start_tls.complete":
+                self.tls_handshakes += 1
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def as_dict(self) -> Dict:
+        """Snapshot for monitoring."""
+        return {
+            'clients_created': self.clients_created,
+            'requests': self.requests,
+            'new_connections': self.new_connections,
+            'tls_handshakes': self.tls_handshakes,
+            'reused_connections': max(self.requests - self.new_connections, 0),
+        }
+
+
+_stats = ConnectionStats()
+_clients: Dict[str, anthropic.Anthropic] = {}
+_async_clients: Dict[str, anthropic.AsyncAnthropic] = {}
+_registry_lock = threading.Lock()
+
+
+def _trace(event_name: str, info: Dict):
+    _stats.record(event_name)
+
+
+async def _async_trace(event_name: str, info: Dict):
+    _stats.record(event_name)
+
+
+def _attach_trace(request: httpx.Request):
+    """httpx request hook: count the request and trace its connection events."""
+    _stats.record_request()
+    request.extensions["trace"] = _trace
+
+
+async def _attach_async_trace(request: httpx.Request):
+    _stats.record_request()
+    request.extensions["trace"] = _async_trace
+
+
+def _retry_delay(client, remaining_retries: int, options, response_headers=None) -> float:
+    """Exponential backoff with jitter, honouring a short Retry-After header."""
+    retry_after = client._parse_retry_after_header(response_headers)
+    if retry_after is not None and 0 < retry_after <= 60:
+        return retry_after
+
+    attempt = min(options.get_max_retries(client.max_retries) - remaining_retries, 1000)
+    delay = min(LLM_RETRY_INITIAL_DELAY * pow(2.0, attempt), LLM_RETRY_MAX_DELAY)
+    return delay * (1 - 0.25 * random.random())
+
+
+class PooledAnthropic(anthropic.Anthropic):
+    """Anthropic client using this module's backoff settings."""
+
+    def _calculate_retry_timeout(self, remaining_retries, options, response_headers=None):
+        return _retry_delay(self, remaining_retries, options, response_headers)
+
+
+class PooledAsyncAnthropic(anthropic.AsyncAnthropic):
+    """AsyncAnthropic client using this module's backoff settings."""
+
+    def _calculate_retry_timeout(self, remaining_retries, options, response_headers=None):
+        return _retry_delay(self, remaining_retries, options, response_headers)
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+
+
+def get_client(api_key: str = None) -> anthropic.Anthropic:
+    """
+    Return the shared sync client for an API key, creating it on first use.
+
+    Args:
+        api_key: Anthropic API key (defaults to ANTHROPIC_API_KEY)
+
+    Returns:
+        Pooled Anthropic client
+    """
+    api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
+
+    with _registry_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = PooledAnthropic(
+                api_key=api_key,
+                max_retries=LLM_MAX_RETRIES,
+                timeout=_timeout(),
+                http_client=anthropic.DefaultHttpxClient(
+                    limits=_limits(),
+                    timeout=_timeout(),
+                    event_hooks={"request": [_attach_trace]}
+                )
+            )
+            _clients[api_key] = client
+            _stats.clients_created += 1
+
+    return client
+
+
+def get_async_client(api_key: str = None) -> anthropic.AsyncAnthropic:
+    """
+    Return the shared async client for an API key, creating it on first use.
+
+    The async connection pool belongs to the event loop that first uses it,
+    so use this from a single long-running loop (one per worker process).
+
+    Args:
+        api_key: Anthropic API key (defaults to ANTHROPIC_API_KEY)
+
+    Returns:
+        Pooled AsyncAnthropic client
+    """
+    api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
+
+    with _registry_lock:
+        client = _async_clients.get(api_key)
+        if client is None:
+            client = PooledAsyncAnthropic(
+                api_key=api_key,
+                max_retries=LLM_MAX_RETRIES,
+                timeout=_timeout(),
+                http_client=anthropic.DefaultAsyncHttpxClient(
+                    limits=_limits(),
+                    timeout=_timeout(),
+                    event_hooks={"request": [_attach_async_trace]}
+                )
+            )
+            _async_clients[api_key] = client
+            _stats.clients_created += 1
+
+    return client
+
+
+async def close_async_clients():
+    """Close every async client (graceful shutdown of an ASGI worker)."""
+    with _registry_lock:
+        clients = list(_async_clients.values())
+        _async_clients.clear()
+
+    for client in clients:
+        await client.close()
+
+
+def connection_stats() -> Dict:
+    """Connection reuse counters across every registered client."""
+    return _stats.as_dict()
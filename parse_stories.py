@@ -2,12 +2,19 @@
 """
 Parse Complete Sherlock Holmes Canon
 Splits the giant text file into individual stories with metadata
+
+For multi-gigabyte inputs, --stream memory-maps the file and extracts
+stories in worker processes, so peak memory is one story per worker:
+    python parse_stories.py --stream [--workers N]
 """
 
 import os                    # File operations
 import re                    # Regular expressions
 import json                  # Save metadata
-from typing import List, Dict
+import mmap                  # Streaming mode: zero-copy input
+import argparse              # Command-line options
+import multiprocessing as mp # Streaming mode: parallel extraction
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
 
 # Story metadata (manually compiled from canon knowledge)
 STORY_METADATA = {
@@ -103,48 +110,133 @@ def normalize_title(title: str) -> str:
     return normalized
 
 
-def find_story_boundaries(text: str) -> List[Dict]:
+def title_variants(title: str) -> List[str]:
+    """Spellings a title may appear under, in preference order (matched case-insensitively)."""
+    variants = [
+        title.upper(),                    # ALL CAPS
+        title,                            # As-is
+        title.replace("The Adventure of the ", "").replace("The Adventure of ", ""),  # Without prefix
+    ]
+    # Case-insensitive matching makes ALL CAPS and as-is the same pattern
+    return list(dict.fromkeys(variant.lower() for variant in variants))
+
+
+def iter_text_lines(text: str) -> Iterator[Tuple[int, int, str]]:
+    """(start, end, line) for each line of an in-memory text; end is the newline's index."""
+    line_start = 0
+    for line in text.split('\n'):
+        line_end = line_start + len(line)
+        yield line_start, line_end, line
+        line_start = line_end + 1
+
+
+def iter_mapped_lines(buffer: mmap.mmap) -> Iterator[Tuple[int, int, str]]:
+    """(start, end, line) for each line of a memory-mapped UTF-8 file, as byte offsets."""
+    size = len(buffer)
+    line_start = 0
+    while line_start <= size:
+        line_end = buffer.find(b'\n', line_start)
+        if line_end < 0:
+            line_end = size
+        yield line_start, line_end, buffer[line_start:line_end].decode('utf-8')
+        line_start = line_end + 1
+
+
+def scan_title_lines(lines: Iterable[Tuple[int, int, str]], length: int,
+                     titles: List[str], stats: Optional[Dict] = None) -> Dict[str, List[int]]:
     """
-    Find story boundaries in the complete canon text.
-    Returns list of stories with start/end positions and titles.
+    Every occurrence of every title variant, in ONE sweep over the lines.
+
+    A title only counts when it is alone on its line, so each stripped,
+    lowercased line is a single dict lookup against all variants at once.
+    Positions match what re.finditer(f'\\n\\s*{variant}\\s*\\n', text,
+    re.IGNORECASE) returns per variant: the newline ending the previous
+    non-blank line, with an occurrence skipped when only blank lines
+    separate it from the previous counted one (the regex consumed it).
+
+    Args:
+        lines: (start, end, line) per line, in order (see iter_text_lines / iter_mapped_lines)
+        length: Length of the whole input (same units as the offsets)
+        titles: Known story titles
+        stats: If given, 'characters' and 'words' totals are added to it in the same pass
+
+    Returns:
+        Lowercased variant -> match start positions, in text order
+    """
+    variants = {variant for title in titles for variant in title_variants(title)}
+
+    occurrences: Dict[str, List[int]] = {}
+    first_newline = None                        # Newline ending the first line
+    previous_newline = None                     # Newline ending the last non-blank line
+    previous_counted = None                     # Variant counted on the last non-blank line
+    characters = words = 0
+
+    for line_start, line_end, line in lines:
+        if first_newline is None:
+            first_newline = line_end
+        characters += len(line) + (line_end < length)
+        stripped = line.strip()
+
+        if stripped:
+            variant = stripped.lower()
+            counted = None
+            if stats is not None:
+                words += len(line.split())
+
+            # The regex needs a newline before the title and one after it
+            start = previous_newline if previous_newline is not None else (
+                first_newline if first_newline < line_start else None
+            )
+            if (variant in variants and start is not None and line_end < length
+                    and previous_counted != variant):
+                occurrences.setdefault(variant, []).append(start)
+                counted = variant
+
+            previous_newline = line_end
+            previous_counted = counted
+
+    if stats is not None:
+        stats['characters'] = stats.get('characters', 0) + characters
+        stats['words'] = stats.get('words', 0) + words
+
+    return occurrences
+
+
+def find_title_occurrences(text: str, titles: List[str]) -> Dict[str, List[int]]:
+    """Every occurrence of every title variant in an in-memory text (see scan_title_lines)."""
+    return scan_title_lines(iter_text_lines(text), len(text), titles)
+
+
+def select_story_boundaries(occurrences: Dict[str, List[int]], length: int) -> List[Dict]:
+    """
+    Pick each known story's start from its title occurrences.
+
+    Args:
+        occurrences: Lowercased variant -> start positions (from scan_title_lines)
+        length: Length of the whole input (end of the last story)
+
+    Returns:
+        Stories with title, start, end and normalized_title, in text order
     """
-    print("📖 Analyzing story structure...")
-    
     stories = []
     
-    # Find all story titles (they appear as large centered text)
-    # Pattern: look for lines that are all caps or title case, surrounded by whitespace
-    title_pattern = r'\n\s*([A-Z][A-Za-z\s\-\'",]+)\s*\n'
-    
-    # Known story titles from metadata
-    known_titles = list(STORY_METADATA.keys())
-    
     # Find positions of each known title
-    for title in known_titles:
-        # Try different variations of the title
-        patterns = [
-            title.upper(),                    # ALL CAPS
-            title,                            # As-is
-            title.replace("The Adventure of the ", "").replace("The Adventure of ", ""),  # Without prefix
-        ]
-        
-        for pattern in patterns:
-            # Escape special regex characters
-            escaped = re.escape(pattern)
-            # Find in text
-            matches = list(re.finditer(f'\n\s*{escaped}\s*\n', text, re.IGNORECASE))
+    for title in STORY_METADATA:
+        # Try each variation of the title in order
+        for variant in title_variants(title):
+            matches = occurrences.get(variant)
             
             if matches:
                 # Use the first match (story title in table of contents appears first)
                 # We want the SECOND occurrence (actual story start)
                 if len(matches) >= 2:
-                    match = matches[1]  # Second occurrence (after TOC)
+                    start = matches[1]  # Second occurrence (after TOC)
                 else:
-                    match = matches[0]  # Fallback to first if only one
+                    start = matches[0]  # Fallback to first if only one
                 
                 stories.append({
                     'title': title,
-                    'start': match.start(),
+                    'start': start,
                     'normalized_title': normalize_title(title)
                 })
                 break  # Found it, move to next title
@@ -158,12 +250,52 @@ def find_story_boundaries(text: str) -> List[Dict]:
     
     # Last story goes to end of file
     if stories:
-        stories[-1]['end'] = len(text)
+        stories[-1]['end'] = length
+    
+    return stories
+
+
+def find_story_boundaries(text: str) -> List[Dict]:
+    """
+    Find story boundaries in the complete canon text.
+    Returns list of stories with start/end positions and titles.
+    """
+    print("📖 Analyzing story structure...")
+    
+    # Every title line in the canon, found in a single pass
+    occurrences = find_title_occurrences(text, list(STORY_METADATA.keys()))
+    stories = select_story_boundaries(occurrences, len(text))
     
     print(f"   Found {len(stories)} stories")
     return stories
 
 
+def story_filename(index: int, title: str) -> str:
+    """Output filename for the index-th story (sanitized title)."""
+    filename = title.replace(' ', '_').replace('"', '').replace('/', '_')
+    return f"{index:02d}_{filename}.txt"
+
+
+def story_record(index: int, title: str, story_text: str) -> Dict:
+    """Metadata entry for an extracted (cleaned) story."""
+    metadata = STORY_METADATA.get(title, {
+        "year": None,
+        "type": "unknown",
+        "collection": "Unknown"
+    })
+    
+    return {
+        'id': index,
+        'title': title,
+        'filename': story_filename(index, title),
+        'year': metadata['year'],
+        'type': metadata['type'],
+        'collection': metadata['collection'],
+        'word_count': len(story_text.split()),
+        'char_count': len(story_text)
+    }
+
+
 def extract_stories(input_file: str, output_dir: str) -> List[Dict]:
     """
     Extract individual stories from the complete canon.
@@ -208,37 +340,106 @@ def extract_stories(input_file: str, output_dir: str) -> List[Dict]:
         story_text = full_text[start:end]
         story_text = clean_text(story_text)
         
-        # Get metadata
-        metadata = STORY_METADATA.get(title, {
-            "year": None,
-            "type": "unknown",
-            "collection": "Unknown"
-        })
-        
-        # Create filename (sanitize title)
-        filename = title.replace(' ', '_').replace('"', '').replace('/', '_')
-        filename = f"{i:02d}_{filename}.txt"
-        filepath = os.path.join(output_dir, filename)
-        
         # Save story
-        with open(filepath, 'w', encoding='utf-8') as f:
+        record = story_record(i, title, story_text)
+        with open(os.path.join(output_dir, record['filename']), 'w', encoding='utf-8') as f:
             f.write(story_text)
         
-        word_count = len(story_text.split())
-        
-        print(f"✅ {i:2d}. {title[:50]:<50} ({word_count:>6,} words)")
+        print(f"✅ {i:2d}. {title[:50]:<50} ({record['word_count']:>6,} words)")
         
         # Store metadata
-        extracted_stories.append({
-            'id': i,
-            'title': title,
-            'filename': filename,
-            'year': metadata['year'],
-            'type': metadata['type'],
-            'collection': metadata['collection'],
-            'word_count': word_count,
-            'char_count': len(story_text)
-        })
+        extracted_stories.append(record)
+    
+    print("\n" + "=" * 70)
+    print(f"✅ Extracted {len(extracted_stories)} stories!")
+    
+    return extracted_stories
+
+
+def _extract_mapped_story(task: Tuple[str, str, int, str, int, int]) -> Dict:
+    """Worker: decode, clean and write one story from the mapped input; returns its record."""
+    input_file, output_dir, index, title, start, end = task
+    
+    with open(input_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        story_text = clean_text(buffer[start:end].decode('utf-8'))
+    
+    record = story_record(index, title, story_text)
+    with open(os.path.join(output_dir, record['filename']), 'w', encoding='utf-8') as f:
+        f.write(story_text)
+    
+    # Byte offsets of the raw story in the input file
+    record['source_start'] = start
+    record['source_end'] = end
+    return record
+
+
+def iter_stories(input_file: str, output_dir: str,
+                 workers: Optional[int] = None, stats: Optional[Dict] = None) -> Iterator[Dict]:
+    """
+    Stream stories out of a memory-mapped canon file.
+    
+    One pass over the mapped lines finds every title occurrence (and counts
+    characters and words); stories are then decoded, cleaned and written by
+    a process pool, one story per task. Nothing larger than a line or a
+    single story is ever held in memory.
+    
+    Args:
+        input_file: Path to complete canon text file (UTF-8)
+        output_dir: Where to save individual story files
+        workers: Extraction processes (default: CPU count)
+        stats: If given, receives 'characters' and 'words' totals of the input
+        
+    Yields:
+        Story metadata records, in story order, as each story is written
+    """
+    with open(input_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        occurrences = scan_title_lines(iter_mapped_lines(buffer), len(buffer), list(STORY_METADATA.keys()), stats)
+        boundaries = select_story_boundaries(occurrences, len(buffer))
+    
+    if not boundaries:
+        return
+    
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = [
+        (input_file, output_dir, i, story['title'], story['start'], story['end'])
+        for i, story in enumerate(boundaries, 1)
+    ]
+    
+    with mp.Pool(workers or os.cpu_count()) as pool:
+        for record in pool.imap(_extract_mapped_story, tasks):
+            yield record
+
+
+def extract_stories_streaming(input_file: str, output_dir: str, workers: Optional[int] = None) -> List[Dict]:
+    """
+    Streaming counterpart of extract_stories (same outputs, flat memory).
+    
+    Args:
+        input_file: Path to complete canon text file
+        output_dir: Where to save individual story files
+        workers: Extraction processes (default: CPU count)
+        
+    Returns:
+        List of story metadata
+    """
+    print(f"\n📚 Streaming stories from: {input_file}")
+    print("=" * 70)
+    print("📖 Analyzing story structure (memory-mapped)...")
+    
+    stats = {}
+    extracted_stories = []
+    
+    for record in iter_stories(input_file, output_dir, workers, stats):
+        if not extracted_stories:
+            print(f"   {stats['characters']:,} characters total")
+            print(f"   ~{stats['words']:,} words total\n")
+        
+        print(f"✅ {record['id']:2d}. {record['title'][:50]:<50} ({record['word_count']:>6,} words)")
+        extracted_stories.append(record)
+    
+    if not extracted_stories:
+        print("❌ Could not find story boundaries!")
+        return []
     
     print("\n" + "=" * 70)
     print(f"✅ Extracted {len(extracted_stories)} stories!")
@@ -293,6 +494,13 @@ def print_statistics(stories: List[Dict]):
 
 def main():
     """Main function."""
+    parser = argparse.ArgumentParser(description="Split the complete canon into individual stories")
+    parser.add_argument('--stream', action='store_true',
+                        help="memory-map the input and extract stories in parallel (for very large inputs)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="extraction processes in --stream mode (default: CPU count)")
+    args = parser.parse_args()
+    
     print("\n" + "=" * 70)
     print("🔍 SHERLOCK HOLMES STORY PARSER")
     print("=" * 70)
@@ -309,7 +517,10 @@ def main():
         return
     
     # Extract stories
-    stories = extract_stories(input_file, output_dir)
+    if args.stream:
+        stories = extract_stories_streaming(input_file, output_dir, args.workers)
+    else:
+        stories = extract_stories(input_file, output_dir)
     
     if not stories:
         print("\n❌ Failed to extract stories!")
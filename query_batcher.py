@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Query Batcher for SherlockRAG
+Micro-batching scheduler: coalesces concurrent vector searches into one batched pass
+"""
+
+import time                                         # Batch window
+import queue                                        # Request queue
+import threading                                    # Scheduler thread
+from concurrent.futures import Future               # Per-request results
+from typing import Callable, Dict, List             # Type hints
+
+
+class _Request:
+    """One caller's queries, waiting for a batch."""
+
+    def __init__(self, queries: List[str], k: int):
+        self.queries = queries
+        self.k = k
+        self.future = Future()
+
+
+class QueryBatcher:
+    """
+    Collects query texts from concurrent requests for a short window
+    (a few milliseconds), runs ONE batched encode + vector search for all
+    of them, then fans the results back out to each waiting request.
+
+    Batched CPU inference is several times cheaper per query than
+    batch-of-one, so this raises QPS per process under concurrent load.
+    """
+
+    def __init__(self, search_fn: Callable[[List[str], int], List[List]],
+                 window_ms: float = 5.0, max_batch: int = 64):
+        """
+        Args:
+            search_fn: Batched search (queries, k) -> one result list per query
+            window_ms: How long to wait for more requests after the first arrives
+            max_batch: Maximum number of queries per batch
+        """
+        self.search_fn = search_fn
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+
+        self.batches = 0
+        self.requests = 0
+        self.queries = 0
+
+        self._thread = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, queries: List[str], k: int = 8) -> Future:
+        """
+        Queue queries for the next batch.
+
+        Returns:
+            Future resolving to one ranked result list per query
+        """
+        request = _Request(list(queries), k)
+        self._queue.put(request)
+        return request.future
+
+    def search(self, queries: List[str], k: int = 8) -> List[List]:
+        """Blocking variant of submit()."""
+        return self.submit(queries, k).result()
+
+    def _run(self):
+        """Scheduler loop: gather a batch for up to `window`, then execute it."""
+        while True:
+            batch = [self._queue.get()]
+            num_queries = len(batch[0].queries)
+            deadline = time.monotonic() + self.window
+
+            while num_queries < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                num_queries += len(request.queries)
+
+            self._execute(batch)
+
+    def _execute(self, batch: List[_Request]):
+        """Run one search for every (deduplicated) query in the batch and fan out."""
+        unique_queries = list(dict.fromkeys(q for request in batch for q in request.queries))
+        k = max(request.k for request in batch)
+
+        try:
+            results = self.search_fn(unique_queries, k) if unique_queries else []
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        results_by_query = dict(zip(unique_queries, results))
+        for request in batch:
+            request.future.set_result([results_by_query[q][:request.k] for q in request.queries])
+
+        self.batches += 1
+        self.requests += len(batch)
+        self.queries += len(unique_queries)
+
+    def stats(self) -> Dict:
+        """Batching counters for monitoring."""
+        return {
+            'batches': self.batches,
+            'requests': self.requests,
+            'queries': self.queries,
+            'avg_requests_per_batch': round(self.requests / self.batches, 2) if self.batches else 0.0,
+        }
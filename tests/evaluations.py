@@ -8,14 +8,22 @@ import json
 import os
 import sys
 from datetime import datetime
-import anthropic
 from dotenv import load_dotenv
 
 # Add parent directory to path so we can import from project root
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from llm_clients import get_client  # Shared pooled Anthropic client
+
 load_dotenv()
 
+# Questions that once failed because the answer chunk ranked too low
+# (see Watson_wound_issue.txt); the retrieved context must contain every term
+RETRIEVAL_REGRESSIONS = [
+    {"question": "What was Watson's war wound location?", "expected_terms": ["jezail", "shoulder"]},
+    {"question": "Did Watson have a moustache?", "expected_terms": ["moustache"]},
+]
+
 
 def evaluate_retrieval(test, result):
     """
@@ -69,7 +77,7 @@ def evaluate_relevance(test, result, api_key):
     question = test['question']
     answer = result.get('actual_answer', '')
     
-    client = anthropic.Anthropic(api_key=api_key)
+    client = get_client(api_key)
     
     prompt = f"""Evaluate if this answer addresses the question.
 
@@ -128,7 +136,7 @@ def evaluate_faithfulness(test, result, api_key):
     # For simplicity, we'll use Claude to check
     # (In production, you'd extract chunks and check sentence-by-sentence)
     
-    client = anthropic.Anthropic(api_key=api_key)
+    client = get_client(api_key)
     
     prompt = f"""Evaluate if this answer is faithful to the Sherlock Holmes canon.
 
@@ -175,7 +183,7 @@ def evaluate_correctness(test, result, api_key):
     expected = test.get('expected_answer', '')
     actual = result.get('actual_answer', '')
     
-    client = anthropic.Anthropic(api_key=api_key)
+    client = get_client(api_key)
     
     prompt = f"""Compare this answer to the expected answer for factual correctness.
 
@@ -211,6 +219,41 @@ Return ONLY a number from 0-100, nothing else."""
         return 50
 
 
+def evaluate_retrieval_regressions(persist_directory="data/chroma_db"):
+    """
+    Check that RETRIEVAL_REGRESSIONS questions still retrieve their answer chunk.
+    Runs vector search + BM25 + context assembly for the original question
+    only (no LLM calls), so it is deterministic
+    Returns: True if every case passed
+    """
+    from chatbot import load_vector_store, multi_query_search, keyword_search, assemble_context
+    
+    print("=" * 70)
+    print("🔁 RETRIEVAL REGRESSIONS")
+    print("=" * 70)
+    
+    vectorstore = load_vector_store(persist_directory)
+    passed = 0
+    
+    for case in RETRIEVAL_REGRESSIONS:
+        question = case['question']
+        ranked_lists = multi_query_search(vectorstore, [question], k=8)
+        bm25_results = keyword_search(vectorstore, question, k=8)
+        context, _ = assemble_context(question, [question], ranked_lists, bm25_results)
+        
+        missing = [term for term in case['expected_terms'] if term not in context.lower()]
+        if missing:
+            print(f"  ❌ {question} (context lacks: {', '.join(missing)})")
+        else:
+            passed += 1
+            print(f"  ✅ {question}")
+    
+    print(f"\n{passed}/{len(RETRIEVAL_REGRESSIONS)} retrieval regressions passed")
+    print("=" * 70)
+    
+    return passed == len(RETRIEVAL_REGRESSIONS)
+
+
 def evaluate_all(results_file):
     """Run all 4 metrics on test results"""
     
@@ -341,7 +384,9 @@ def evaluate_all(results_file):
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
+    if len(sys.argv) > 1 and sys.argv[1] == "--regressions":
+        sys.exit(0 if evaluate_retrieval_regressions() else 1)
+    elif len(sys.argv) < 2:
         print("Usage: python3 evaluation.py <test_results_file.json>")
         print("\nLooking for most recent test_results file...")
         
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Title Router for SherlockRAG
+Detects story titles named in a question, so retrieval can be scoped to those stories
+
+Aliases come from the STORY_METADATA titles: the full title, the title
+without "The Adventure of (the)" (normalize_title) and without a leading
+article, e.g. "The Adventure of the Red Circle" -> "Red Circle", plus the
+article form "The Red Circle".
+Matching is a longest-match lookup of token n-grams against one alias
+dict, so a question is scanned once regardless of how many titles exist.
+
+Titles are often everyday phrases ("the final problem Holmes faced"), so
+an alias only matches when the question writes it in title case ("The
+Final Problem", "the Red Circle"); minor words may stay lowercase.
+"""
+
+import re                                           # Tokenization
+from typing import Dict, List, Tuple                # Type hints
+
+from parse_stories import STORY_METADATA, normalize_title  # Canon titles
+
+
+# Lowercase alphanumeric runs ("Engineer's" -> "engineer", "s")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Alphanumeric runs with their case as written (for the title-case check)
+CASED_TOKEN_PATTERN = re.compile(r"[A-Za-z0-9]+")
+
+# Aliases shorter than this many tokens are too ambiguous to route on
+MIN_ALIAS_TOKENS = 2
+
+# Words a title-cased alias may leave lowercase ("the Man with the Twisted Lip")
+MINOR_WORDS = {'a', 'an', 'and', 'at', 'by', 'for', 'from', 'in', 'of', 'on', 'the', 'to', 'with'}
+
+LEADING_ARTICLE = re.compile(r'^(the|a|an) ', re.IGNORECASE)
+ADVENTURE_OF_THE = re.compile(r'^The Adventure of the ', re.IGNORECASE)
+
+
+def tokenize(text: str) -> Tuple[str, ...]:
+    """Lowercase alphanumeric tokens."""
+    return tuple(TOKEN_PATTERN.findall(text.lower()))
+
+
+def is_title_cased(words: Tuple[str, ...]) -> bool:
+    """True if every word (as written) is capitalized, minor words and numbers aside."""
+    return all(word[0].isupper() or word[0].isdigit() or word.lower() in MINOR_WORDS for word in words)
+
+
+def title_aliases(title: str) -> List[str]:
+    """Ways a question may name a story."""
+    normalized = normalize_title(title)
+    aliases = [title, normalized, LEADING_ARTICLE.sub('', normalized)]
+    # "The Adventure of the Red Circle" is also asked for as "The Red Circle"
+    if ADVENTURE_OF_THE.match(title):
+        aliases.append(f"The {normalized}")
+    # "His Last Bow: The War Service of Sherlock Holmes" is also asked for by its short name
+    aliases.extend(alias.split(':')[0] for alias in list(aliases) if ':' in alias)
+    return list(dict.fromkeys(aliases))
+
+
+class TitleRouter:
+    """
+    Maps questions to the story titles they mention.
+
+    An alias shared by several stories routes to all of them.
+    """
+
+    def __init__(self, titles: List[str]):
+        """
+        Args:
+            titles: Story titles (as stored in chunk metadata)
+        """
+        self.aliases: Dict[Tuple[str, ...], List[str]] = {}
+        for title in titles:
+            for alias in title_aliases(title):
+                tokens = tokenize(alias)
+                if len(tokens) >= MIN_ALIAS_TOKENS:
+                    matches = self.aliases.setdefault(tokens, [])
+                    if title not in matches:
+                        matches.append(title)
+
+        self.max_tokens = max((len(tokens) for tokens in self.aliases), default=0)
+
+    def match(self, query: str) -> List[str]:
+        """
+        Titles named in a question (longest title-cased alias wins at each position).
+
+        Args:
+            query: User's question
+
+        Returns:
+            Matched titles in order of mention (empty if none)
+        """
+        words = tuple(CASED_TOKEN_PATTERN.findall(query))
+        tokens = tuple(word.lower() for word in words)
+        titles: List[str] = []
+
+        position = 0
+        while position < len(tokens):
+            for length in range(min(self.max_tokens, len(tokens) - position), MIN_ALIAS_TOKENS - 1, -1):
+                matches = self.aliases.get(tokens[position:position + length])
+                if matches and is_title_cased(words[position:position + length]):
+                    titles.extend(title for title in matches if title not in titles)
+                    position += length
+                    break
+            else:
+                position += 1
+
+        return titles
+
+
+_router = None
+
+
+def get_title_router() -> TitleRouter:
+    """Shared router over the canon titles (built on first use)."""
+    global _router
+
+    if _router is None:
+        _router = TitleRouter(list(STORY_METADATA.keys()))
+
+    return _router
@@ -0,0 +1,776 @@
+#!/usr/bin/env python3
+"""
+Vector Backends for SherlockRAG
+NumPy flat exact search over a memory-mapped embedding matrix (alternative to Chroma),
+plus int8 / float16 quantized search with full-precision rescoring, an
+IVF (inverted file) index for sub-linear search with a tunable nprobe, and
+a story-level centroid index for two-stage (story -> chunk) retrieval
+
+Export an existing Chroma index, quantize it and train its IVF index (build_index.py does this automatically):
+    python vector_backends.py
+"""
+
+import os                                           # File operations
+import json                                         # Chunk table
+from typing import Any, Dict, List, Optional, Sequence, Tuple  # Type hints
+import numpy as np                                  # Matrix search
+from langchain_core.embeddings import Embeddings    # LangChain embedding interface
+from langchain_core.vectorstores import VectorStore  # LangChain vector store interface
+from langchain.docstore.document import Document    # Document structure
+
+from index_manifest import chunk_id_of              # Stable row order
+from chunk_store import ChunkStore                  # mmap'd chunk texts
+
+
+# Flat index files (inside the Chroma persist directory, next to the manifest)
+FLAT_DIRNAME = "flat"
+VECTORS_FILENAME = "embeddings.npy"
+CHUNKS_FILENAME = "chunks.json"
+
+# Quantized codes (inside FLAT_DIRNAME), one pair of files per variant
+CODES_FILENAME = "codes-{variant}.npy"
+SCALES_FILENAME = "scales-{variant}.npy"
+QUANTIZED_VARIANTS = (("float16", "dimension"), ("int8", "dimension"), ("int8", "vector"))
+
+# Quantized search: candidates per result kept from the compact first pass
+RESCORE_FACTOR = 4
+
+# Rows converted per block when quantizing or scoring compact codes (bounds temporary memory)
+SCORE_BLOCK_ROWS = 4096
+
+# IVF index files (inside FLAT_DIRNAME, next to the chunk table)
+IVF_FILENAME = "ivf.npz"
+IVF_SETTINGS_FILENAME = "ivf.json"
+
+# IVF defaults: nlist ~ sqrt(num_chunks) clusters, nprobe of them searched per query
+IVF_LISTS_PER_SQRT = 1
+IVF_NPROBE = 8
+KMEANS_ITERATIONS = 20
+KMEANS_SEED = 0
+
+# Story-level index (inside FLAT_DIRNAME): one centroid per story + its chunk rows
+STORIES_FILENAME = "stories.npz"
+
+# Two-stage retrieval: stories searched at chunk level per query
+TOP_STORIES = 5
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k columns of each row of a score matrix, best first.
+
+    Args:
+        scores: (num_queries, num_rows) scores
+        k: Number of columns per row (clipped to num_rows)
+
+    Returns:
+        (indices, scores), each (num_queries, k)
+    """
+    k = min(k, scores.shape[1])
+    if k == 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+
+    # Top-k per row without sorting every column
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def export_flat_index(collection, persist_directory: str) -> int:
+    """
+    Write a Chroma collection's vectors and chunks as a flat index.
+
+    Rows are ordered by chunk ID, so exports of the same build are identical.
+
+    Args:
+        collection: Chroma collection (vectorstore._collection)
+        persist_directory: Index directory (flat files go in its FLAT_DIRNAME subdirectory)
+
+    Returns:
+        Number of chunks exported
+    """
+    data = collection.get(include=['embeddings', 'documents', 'metadatas'])
+    metadatas = [meta or {} for meta in data['metadatas']]
+
+    order = sorted(range(len(metadatas)), key=lambda i: (chunk_id_of(metadatas[i]) or 0, i))
+    vectors = np.asarray(data['embeddings'], dtype=np.float32)[order]
+
+    # Unit length, so a dot product is cosine similarity
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.maximum(norms, 1e-12)
+
+    flat_directory = os.path.join(persist_directory, FLAT_DIRNAME)
+    os.makedirs(flat_directory, exist_ok=True)
+    np.save(os.path.join(flat_directory, VECTORS_FILENAME), np.ascontiguousarray(vectors))
+    with open(os.path.join(flat_directory, CHUNKS_FILENAME), 'w') as f:
+        json.dump({
+            'documents': [data['documents'][i] for i in order],
+            'metadatas': [metadatas[i] for i in order],
+        }, f)
+
+    return len(order)
+
+
+def quantized_variant(precision: str, scales: str) -> str:
+    """
+    File name part of a quantized variant ("float16", "int8-dimension", "int8-vector").
+
+    Raises:
+        ValueError: On an unknown precision or int8 scale granularity
+    """
+    if precision not in ("int8", "float16"):
+        raise ValueError(f"Unknown precision: {precision}")
+    if scales not in ("dimension", "vector"):
+        raise ValueError(f"Unknown int8 scales: {scales}")
+    return precision if precision == "float16" else f"{precision}-{scales}"
+
+
+def build_quantized_index(persist_directory: str, precision: str = "int8",
+                          scales: str = "dimension") -> int:
+    """
+    Quantize an exported flat index into compact codes on disk.
+
+    The float32 matrix is read block by block from its memory map and the
+    codes are written into a preallocated .npy file, so no temporary is
+    larger than SCORE_BLOCK_ROWS rows. int8 per-dimension scales take one
+    extra pass for the column maxima.
+
+    Args:
+        persist_directory: Index directory (flat files must already exist)
+        precision: "int8" or "float16"
+        scales: int8 scale granularity, "dimension" or "vector"
+
+    Returns:
+        Size of the codes in bytes
+    """
+    variant = quantized_variant(precision, scales)
+    flat_directory = os.path.join(persist_directory, FLAT_DIRNAME)
+    vectors = np.load(os.path.join(flat_directory, VECTORS_FILENAME), mmap_mode='r')
+    num_rows, dim = vectors.shape
+    blocks = range(0, num_rows, SCORE_BLOCK_ROWS)
+
+    code_dtype = np.float16 if precision == "float16" else np.int8
+    codes = np.lib.format.open_memmap(os.path.join(flat_directory, CODES_FILENAME.format(variant=variant)),
+                                      mode='w+', dtype=code_dtype, shape=(num_rows, dim))
+
+    code_scales = None
+    if precision == "int8" and scales == "dimension":
+        max_abs = np.zeros(dim, dtype=np.float32)
+        for start in blocks:
+            np.maximum(max_abs, np.abs(vectors[start:start + SCORE_BLOCK_ROWS]).max(axis=0), out=max_abs)
+        code_scales = np.maximum(max_abs / 127.0, 1e-12)
+    elif precision == "int8":
+        code_scales = np.empty(num_rows, dtype=np.float32)
+
+    for start in blocks:
+        block = np.asarray(vectors[start:start + SCORE_BLOCK_ROWS], dtype=np.float32)
+        if precision == "float16":
+            codes[start:start + len(block)] = block
+            continue
+        if scales == "vector":
+            block_scales = np.maximum(np.abs(block).max(axis=1) / 127.0, 1e-12)
+            code_scales[start:start + len(block)] = block_scales
+            divisor = block_scales[:, None]
+        else:
+            divisor = code_scales
+        codes[start:start + len(block)] = np.clip(np.rint(block / divisor), -127, 127)
+
+    codes.flush()
+    nbytes = codes.nbytes
+    del codes
+
+    if code_scales is not None:
+        np.save(os.path.join(flat_directory, SCALES_FILENAME.format(variant=variant)),
+                code_scales.astype(np.float32))
+
+    return nbytes
+
+
+class FlatVectorStore(VectorStore):
+    """
+    Exact cosine search with one matrix product over all chunk vectors.
+
+    The corpus (~5k x 384 float32, under 8 MB) fits in cache-friendly
+    contiguous memory, so a BLAS GEMM + argpartition answers a batch of
+    queries faster and with steadier latency than SQLite + HNSW. The matrix
+    is memory-mapped, so forked workers share its pages.
+    """
+
+    def __init__(self, persist_directory: str, embedding_function: Embeddings,
+                 chunk_store: Optional[ChunkStore] = None):
+        """
+        Load a flat index written by export_flat_index.
+
+        Args:
+            persist_directory: Index directory (same one Chroma uses)
+            embedding_function: Query embedding model
+            chunk_store: Serve chunk texts from this mmap'd store instead of the chunk table
+        """
+        flat_directory = os.path.join(persist_directory, FLAT_DIRNAME)
+        vectors_path = os.path.join(flat_directory, VECTORS_FILENAME)
+        if not os.path.exists(vectors_path):
+            raise FileNotFoundError(
+                f"No flat index at {flat_directory} (run build_index.py or vector_backends.py)"
+            )
+
+        self._persist_directory = persist_directory     # Same attribute as Chroma
+        self._embedding_function = embedding_function
+        self.vectors = np.load(vectors_path, mmap_mode='r')
+
+        with open(os.path.join(flat_directory, CHUNKS_FILENAME), 'r') as f:
+            table = json.load(f)
+        self.documents: Sequence[str] = table['documents']
+        self.metadatas: List[Dict] = table['metadatas']
+
+        # Drop the table's strings; texts are decoded from the shared page cache on access
+        # (a store missing some of these chunks belongs to another build and is not used)
+        if chunk_store is not None:
+            try:
+                self.documents = chunk_store.ordered(self.metadatas)
+            except KeyError:
+                chunk_store = None
+        self.chunk_store = chunk_store
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding_function
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def search_vectors(self, query_vectors, k: int = 8,
+                       mask: Optional[np.ndarray] = None) -> List[List[Tuple[int, float]]]:
+        """
+        Top-k rows for each query vector (one GEMM for the whole batch).
+
+        Args:
+            query_vectors: (num_queries, dim) normalized query embeddings
+            k: Number of rows per query
+            mask: Optional boolean row mask; only these rows are scored
+
+        Returns:
+            One list of (row, cosine score) per query, best first
+        """
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+
+        if mask is not None:
+            # Pre-filter: score only the allowed rows
+            allowed = np.flatnonzero(mask)
+            top, top_scores = top_k_rows(queries @ np.asarray(self.vectors[allowed]).T, k)
+            top = allowed[top]
+        else:
+            scores = queries @ self.vectors.T               # (num_queries, num_chunks)
+            top, top_scores = top_k_rows(scores, k)
+
+        return [
+            [(int(row), float(score)) for row, score in zip(rows, row_scores)]
+            for rows, row_scores in zip(top, top_scores)
+        ]
+
+    def get(self, row: int) -> Document:
+        """Document for a row."""
+        return Document(page_content=self.documents[row], metadata=self.metadatas[row])
+
+    def search_documents(self, query_vectors, k: int = 8,
+                         mask: Optional[np.ndarray] = None) -> List[List[Document]]:
+        """Like search_vectors, but returning Documents (what retrieve_context consumes)."""
+        return [[self.get(row) for row, _ in hits] for hits in self.search_vectors(query_vectors, k, mask)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        hits = self.search_vectors([self.embeddings.embed_query(query)], k)[0]
+        return [(self.get(row), score) for row, score in hits]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def add_texts(self, texts, metadatas: Optional[List[Dict]] = None, **kwargs: Any) -> List[str]:
+        raise NotImplementedError("FlatVectorStore is read-only; rebuild with build_index.py")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs: Any):
+        raise NotImplementedError("Build with build_index.py, then load with FlatVectorStore()")
+
+
+class QuantizedVectorStore(FlatVectorStore):
+    """
+    Flat search over compact int8 or float16 codes, rescored in full precision.
+
+    The first pass scores every chunk against the compact codes (4x or 2x
+    smaller than float32). The top k * rescore_factor candidates are then
+    rescored exactly against their float32 rows, read from the matrix file
+    with pread, so the float32 matrix never becomes resident.
+
+    int8 codes are symmetric, with one scale per dimension (folded into the
+    query, so the first pass is a single product) or one scale per vector.
+
+    Codes are written once by build_quantized_index and memory-mapped here,
+    so loading never touches the float32 matrix and no process builds a
+    private copy.
+
+    This backend saves memory, not time. NumPy/BLAS has no int8 or float16
+    matrix product, so every first pass converts the codes back to float32
+    block by block. That makes it slower per query than FlatVectorStore
+    over a page-cached float32 matrix. Use it when the float32 matrix does
+    not fit in RAM.
+    """
+
+    def __init__(self, persist_directory: str, embedding_function: Embeddings,
+                 precision: str = "int8", scales: str = "dimension",
+                 rescore_factor: int = RESCORE_FACTOR, chunk_store: Optional[ChunkStore] = None):
+        """
+        Load a flat index and its quantized codes (see build_quantized_index).
+
+        Args:
+            persist_directory: Index directory (same one Chroma uses)
+            embedding_function: Query embedding model
+            precision: "int8" or "float16"
+            scales: int8 scale granularity, "dimension" or "vector"
+            rescore_factor: Candidates rescored per requested result (0 = no rescoring)
+            chunk_store: Serve chunk texts from this mmap'd store instead of the chunk table
+        """
+        variant = quantized_variant(precision, scales)
+        super().__init__(persist_directory, embedding_function, chunk_store)
+
+        flat_directory = os.path.join(persist_directory, FLAT_DIRNAME)
+        codes_path = os.path.join(flat_directory, CODES_FILENAME.format(variant=variant))
+        if not os.path.exists(codes_path):
+            raise FileNotFoundError(
+                f"No {variant} codes at {flat_directory} (run build_index.py or vector_backends.py)"
+            )
+
+        self.precision = precision
+        self.scales = scales
+        self.rescore_factor = rescore_factor
+        self.codes = np.load(codes_path, mmap_mode='r')
+
+        # Rescored rows are read with pread: faulting scattered rows through the
+        # memory map pages in large folios around each of them
+        self._vectors_fd = os.open(os.path.join(flat_directory, VECTORS_FILENAME), os.O_RDONLY)
+        self._row_bytes = self.vectors.shape[1] * self.vectors.itemsize
+        self.code_scales = None
+        if precision == "int8":
+            self.code_scales = np.load(os.path.join(flat_directory, SCALES_FILENAME.format(variant=variant)),
+                                       mmap_mode='r')
+
+    def float32_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Exact float32 vectors of the given rows, read from the matrix file."""
+        start = self.vectors.offset
+        data = b''.join(os.pread(self._vectors_fd, self._row_bytes, start + int(row) * self._row_bytes)
+                        for row in rows)
+        return np.frombuffer(data, dtype=np.float32).reshape(len(rows), -1)
+
+    def memory_bytes(self) -> int:
+        """Resident size of the compact codes (+ scales)."""
+        scales_bytes = self.code_scales.nbytes if self.code_scales is not None else 0
+        return self.codes.nbytes + scales_bytes
+
+    def approximate_scores(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        First-pass scores against the compact codes, (num_queries, num_rows).
+
+        Costs one float32 conversion of every scored code row per call, on
+        top of the product itself (see the class docstring).
+        """
+        codes = self.codes if rows is None else self.codes[rows]
+        if self.precision == "int8" and self.scales == "dimension":
+            queries = queries * self.code_scales        # Fold per-dimension scales into the query
+
+        # Convert codes block by block (BLAS has no int8/float16 products)
+        # instead of materializing a float32 copy of the matrix
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_BLOCK_ROWS):
+            block = codes[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+            scores[:, start:start + len(block)] = queries @ block.T
+
+        if self.precision == "int8" and self.scales == "vector":
+            scores *= self.code_scales if rows is None else self.code_scales[rows]
+        return scores
+
+    def search_vectors(self, query_vectors, k: int = 8,
+                       mask: Optional[np.ndarray] = None) -> List[List[Tuple[int, float]]]:
+        """
+        Top-k rows for each query vector: compact first pass, exact rescoring.
+
+        Args:
+            query_vectors: (num_queries, dim) normalized query embeddings
+            k: Number of rows per query
+            mask: Optional boolean row mask; only these rows are scored
+
+        Returns:
+            One list of (row, cosine score) per query, best first
+        """
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        allowed = np.flatnonzero(mask) if mask is not None else None
+        approximate = self.approximate_scores(queries, allowed)
+
+        if not self.rescore_factor:
+            top, top_scores = top_k_rows(approximate, k)
+            if allowed is not None:
+                top = allowed[top]
+            return [
+                [(int(row), float(score)) for row, score in zip(rows, row_scores)]
+                for rows, row_scores in zip(top, top_scores)
+            ]
+
+        candidates, _ = top_k_rows(approximate, k * self.rescore_factor)
+        if allowed is not None:
+            candidates = allowed[candidates]
+
+        results = []
+        for query, rows in zip(queries, candidates):
+            # Exact scores from the float32 rows of the candidates only
+            rows = np.sort(rows)                        # Sequential reads from the file
+            exact = self.float32_rows(rows) @ query
+            top, top_scores = top_k_rows(exact[None, :], k)
+            results.append([(int(rows[i]), float(score)) for i, score in zip(top[0], top_scores[0])])
+
+        return results
+
+
+def train_ivf(vectors: np.ndarray, nlist: int, iterations: int = KMEANS_ITERATIONS,
+              seed: int = KMEANS_SEED) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Spherical k-means over unit vectors (the IVF coarse quantizer).
+
+    Args:
+        vectors: (num_chunks, dim) normalized chunk embeddings
+        nlist: Number of clusters (inverted lists)
+        iterations: Lloyd iterations
+        seed: Seed for the initial centroids (same seed -> same index)
+
+    Returns:
+        (centroids, assignments): (nlist, dim) unit centroids, (num_chunks,) list of each row
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    nlist = max(1, min(nlist, len(vectors)))
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+
+        # New centroid = normalized mean of its members (empty lists keep their centroid)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+
+def build_ivf_index(persist_directory: str, nlist: Optional[int] = None,
+                    nprobe: int = IVF_NPROBE) -> Dict:
+    """
+    Train an IVF index over an exported flat index and persist it beside the chunk table.
+
+    Inverted lists are stored as one row permutation plus offsets, so a
+    list is a contiguous slice.
+
+    Args:
+        persist_directory: Index directory (flat files must already exist)
+        nlist: Number of inverted lists (default: IVF_LISTS_PER_SQRT * sqrt(num_chunks))
+        nprobe: Default lists searched per query, stored with the index
+
+    Returns:
+        The persisted IVF settings
+    """
+    flat_directory = os.path.join(persist_directory, FLAT_DIRNAME)
+    vectors = np.load(os.path.join(flat_directory, VECTORS_FILENAME), mmap_mode='r')
+
+    if nlist is None:
+        nlist = int(IVF_LISTS_PER_SQRT * np.sqrt(len(vectors)))
+    centroids, assignments = train_ivf(vectors, nlist)
+
+    list_rows = np.argsort(assignments, kind='stable')
+    list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=len(centroids)))])
+    np.savez(os.path.join(flat_directory, IVF_FILENAME),
+             centroids=centroids.astype(np.float32),
+             list_rows=list_rows.astype(np.int64),
+             list_offsets=list_offsets.astype(np.int64))
+
+    settings = {
+        'nlist': len(centroids),
+        'nprobe': min(nprobe, len(centroids)),
+        'chunk_count': len(vectors),
+        'kmeans_iterations': KMEANS_ITERATIONS,
+        'kmeans_seed': KMEANS_SEED,
+    }
+    with open(os.path.join(flat_directory, IVF_SETTINGS_FILENAME), 'w') as f:
+        json.dump(settings, f, indent=2)
+
+    return settings
+
+
+class IVFVectorStore(FlatVectorStore):
+    """
+    Inverted-file search: only the nprobe lists nearest the query are scanned.
+
+    Chunks are clustered at build time (build_ivf_index). A query is scored
+    against the nlist centroids, then exactly against the float32 rows of
+    its nprobe closest lists, so the work per query is about
+    nlist + num_chunks * nprobe / nlist dot products instead of num_chunks.
+    Raising nprobe trades latency for recall (nprobe = nlist is exact).
+    """
+
+    def __init__(self, persist_directory: str, embedding_function: Embeddings,
+                 nprobe: Optional[int] = None, chunk_store: Optional[ChunkStore] = None):
+        """
+        Load a flat index and its IVF index.
+
+        Args:
+            persist_directory: Index directory (same one Chroma uses)
+            embedding_function: Query embedding model
+            nprobe: Lists searched per query (None = value persisted with the index)
+            chunk_store: Serve chunk texts from this mmap'd store instead of the chunk table
+        """
+        super().__init__(persist_directory, embedding_function, chunk_store)
+
+        flat_directory = os.path.join(persist_directory, FLAT_DIRNAME)
+        ivf_path = os.path.join(flat_directory, IVF_FILENAME)
+        if not os.path.exists(ivf_path):
+            raise FileNotFoundError(
+                f"No IVF index at {flat_directory} (run build_index.py or vector_backends.py)"
+            )
+
+        with open(os.path.join(flat_directory, IVF_SETTINGS_FILENAME), 'r') as f:
+            self.settings: Dict = json.load(f)
+        if self.settings['chunk_count'] != len(self):
+            raise ValueError("IVF index does not match the flat index (rebuild with build_index.py)")
+
+        with np.load(ivf_path) as ivf:
+            self.centroids = ivf['centroids']
+            self.list_rows = ivf['list_rows']
+            self.list_offsets = ivf['list_offsets']
+
+        self.nprobe = nprobe if nprobe is not None else self.settings['nprobe']
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    def candidate_rows(self, query: np.ndarray, mask: Optional[np.ndarray] = None,
+                       nprobe: Optional[int] = None) -> np.ndarray:
+        """
+        Rows of the nprobe lists closest to one query, in ascending order.
+
+        With a row mask, lists holding no allowed row are not probed, and
+        disallowed rows are dropped from the probed lists. nprobe overrides
+        the store's setting for this query only.
+        """
+        centroid_scores = self.centroids @ query
+        if mask is not None:
+            centroid_scores[self.masked_list_sizes(mask) == 0] = -np.inf
+
+        nprobe = max(1, min(nprobe if nprobe is not None else self.nprobe, self.nlist))
+        probes, _ = top_k_rows(centroid_scores[None, :], nprobe)
+        rows = np.concatenate([
+            self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]] for i in probes[0]
+        ])
+        if mask is not None:
+            rows = rows[mask[rows]]
+        return np.sort(rows)                            # Sequential reads from the memory map
+
+    def masked_list_sizes(self, mask: np.ndarray) -> np.ndarray:
+        """Number of allowed rows in each inverted list."""
+        allowed = np.concatenate([[0], np.cumsum(mask[self.list_rows])])
+        return allowed[self.list_offsets[1:]] - allowed[self.list_offsets[:-1]]
+
+    def search_vectors(self, query_vectors, k: int = 8, mask: Optional[np.ndarray] = None,
+                       nprobe: Optional[int] = None) -> List[List[Tuple[int, float]]]:
+        """
+        Top-k rows for each query vector, scanning only the probed lists.
+
+        Args:
+            query_vectors: (num_queries, dim) normalized query embeddings
+            k: Number of rows per query
+            mask: Optional boolean row mask; only these rows are scored
+            nprobe: Lists searched per query (None = the store's nprobe)
+
+        Returns:
+            One list of (row, cosine score) per query, best first
+        """
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+
+        results = []
+        for query in queries:
+            rows = self.candidate_rows(query, mask, nprobe)
+            exact = np.asarray(self.vectors[rows]) @ query
+            top, top_scores = top_k_rows(exact[None, :], k)
+            results.append([(int(rows[i]), float(score)) for i, score in zip(top[0], top_scores[0])])
+
+        return results
+
+
+def build_story_index(persist_directory: str) -> int:
+    """
+    Precompute one centroid per story over an exported flat index.
+
+    A story's vector is the normalized mean of its chunk vectors; its chunk
+    rows are stored as one slice of a row permutation (like IVF lists).
+
+    Args:
+        persist_directory: Index directory (flat files must already exist)
+
+    Returns:
+        Number of stories
+    """
+    flat_directory = os.path.join(persist_directory, FLAT_DIRNAME)
+    vectors = np.load(os.path.join(flat_directory, VECTORS_FILENAME), mmap_mode='r')
+    with open(os.path.join(flat_directory, CHUNKS_FILENAME), 'r') as f:
+        metadatas = json.load(f)['metadatas']
+
+    row_story_ids = np.array([int(meta.get('story_id', -1)) for meta in metadatas], dtype=np.int64)
+    story_ids, assignments = np.unique(row_story_ids, return_inverse=True)
+
+    centroids = np.zeros((len(story_ids), vectors.shape[1]), dtype=np.float32)
+    np.add.at(centroids, assignments, np.asarray(vectors))
+    centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+    story_rows = np.argsort(assignments, kind='stable')
+    story_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=len(story_ids)))])
+    np.savez(os.path.join(flat_directory, STORIES_FILENAME),
+             story_ids=story_ids,
+             centroids=centroids,
+             story_rows=story_rows.astype(np.int64),
+             story_offsets=story_offsets.astype(np.int64))
+
+    return len(story_ids)
+
+
+class StoryIndex:
+    """
+    Two-stage retrieval: a coarse search over story centroids picks the top
+    stories, then chunks are scored exactly only inside those stories.
+
+    Per query that is num_stories + (chunks in the chosen stories) dot
+    products instead of one per chunk. Works with any flat store (chunk
+    rows index its float32 matrix).
+    """
+
+    def __init__(self, persist_directory: str):
+        """
+        Load the story index written by build_story_index.
+
+        Args:
+            persist_directory: Index directory (same one Chroma uses)
+        """
+        path = os.path.join(persist_directory, FLAT_DIRNAME, STORIES_FILENAME)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No story index at {path} (run build_index.py or vector_backends.py)")
+
+        with np.load(path) as stories:
+            self.story_ids = stories['story_ids']
+            self.centroids = stories['centroids']
+            self.story_rows = stories['story_rows']
+            self.story_offsets = stories['story_offsets']
+
+    def __len__(self) -> int:
+        return len(self.story_ids)
+
+    def stories_with_rows(self, mask: np.ndarray) -> np.ndarray:
+        """Boolean mask over stories: True where the story has an allowed chunk row."""
+        allowed = np.concatenate([[0], np.cumsum(mask[self.story_rows])])
+        return allowed[self.story_offsets[1:]] > allowed[self.story_offsets[:-1]]
+
+    def top_stories(self, query: np.ndarray, n: int = TOP_STORIES,
+                    stories: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Positions (into story_ids) of the n stories closest to one query.
+
+        Args:
+            query: (dim,) normalized query embedding
+            n: Number of stories
+            stories: Optional boolean mask over stories; only these are ranked
+        """
+        scores = self.centroids @ query
+        if stories is not None:
+            scores[~stories] = -np.inf
+            n = min(n, int(np.count_nonzero(stories)))
+        top, _ = top_k_rows(scores[None, :], n)
+        return top[0]
+
+    def story_chunk_rows(self, positions: np.ndarray) -> np.ndarray:
+        """Chunk rows of the given stories, in ascending order."""
+        if len(positions) == 0:
+            return np.empty(0, dtype=np.int64)
+        rows = np.concatenate([
+            self.story_rows[self.story_offsets[i]:self.story_offsets[i + 1]] for i in positions
+        ])
+        return np.sort(rows)                            # Sequential reads from the memory map
+
+    def search_vectors(self, store: FlatVectorStore, query_vectors, k: int = 8,
+                       top_stories: int = TOP_STORIES,
+                       mask: Optional[np.ndarray] = None) -> List[List[Tuple[int, float]]]:
+        """
+        Top-k chunk rows for each query vector, searching only its top stories.
+
+        Args:
+            store: Flat store the story index was built from
+            query_vectors: (num_queries, dim) normalized query embeddings
+            k: Number of rows per query
+            top_stories: Stories searched at chunk level per query
+            mask: Optional boolean row mask; only these rows are scored
+
+        Returns:
+            One list of (row, cosine score) per query, best first
+        """
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        stories = self.stories_with_rows(mask) if mask is not None else None
+
+        results = []
+        for query in queries:
+            rows = self.story_chunk_rows(self.top_stories(query, top_stories, stories))
+            if mask is not None:
+                rows = rows[mask[rows]]
+            exact = np.asarray(store.vectors[rows]) @ query
+            top, top_scores = top_k_rows(exact[None, :], k)
+            results.append([(int(rows[i]), float(score)) for i, score in zip(top[0], top_scores[0])])
+
+        return results
+
+
+def recall_at_k(store: FlatVectorStore, query_vectors, k: int = 8, **search_options) -> float:
+    """
+    Mean fraction of the exact float32 top-k that a store returns.
+
+    Measure with real or held-out questions: chunk vectors taken from the
+    index find themselves and overstate recall.
+
+    Args:
+        store: Approximate store (IVF, quantized, ...)
+        query_vectors: (num_queries, dim) normalized query embeddings
+        k: Number of rows per query
+        **search_options: Passed to store.search_vectors (e.g. nprobe)
+
+    Returns:
+        Recall@k in [0, 1]
+    """
+    exact = FlatVectorStore.search_vectors(store, query_vectors, k)
+    found = store.search_vectors(query_vectors, k, **search_options)
+    return float(np.mean([
+        len({row for row, _ in hits} & {row for row, _ in truth}) / max(len(truth), 1)
+        for hits, truth in zip(found, exact)
+    ]))
+
+
+if __name__ == "__main__":
+    import chromadb
+
+    persist_directory = "data/chroma_db"
+    print(f"💾 Exporting flat index from {persist_directory}...")
+    client = chromadb.PersistentClient(path=persist_directory)
+    count = export_flat_index(client.get_collection("sherlock_holmes"), persist_directory)
+    print(f"   ✅ {count} chunks written to {os.path.join(persist_directory, FLAT_DIRNAME)}")
+
+    for precision, scales in QUANTIZED_VARIANTS:
+        nbytes = build_quantized_index(persist_directory, precision, scales)
+        print(f"   🗜️  {quantized_variant(precision, scales)} codes written ({nbytes / 1e6:.1f} MB)")
+
+    settings = build_ivf_index(persist_directory)
+    print(f"   🗂️  IVF index trained (nlist={settings['nlist']}, nprobe={settings['nprobe']})")
+
+    stories = build_story_index(persist_directory)
+    print(f"   📖 Story index built ({stories} story centroids)")